@@ -1,119 +1,378 @@
-import os
-import re
+import numpy as np
 import pandas as pd
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
 from config.category_mapping import CATEGORY_WEBSITES
-from sentence_transformers import SentenceTransformer, util
+from analysis.embedding_backends import BACKENDS, get_backend
+from utils.spec_extraction import SPEC_COLUMNS, extract_specs, parse_title
+from utils.dtypes import optimize_dtypes
+from utils.storage import DEFAULT_FORMAT, FORMATS, load_catalog, table_path, write_table
 
-# Load embedding model
-MODEL = SentenceTransformer('all-MiniLM-L6-v2')
-
-def load_processed_data(category, query):
-    """Load all processed CSVs for a given category and query."""
+def load_processed_data(category, query, columns=None, price_range=None):
+    """Load all processed tables for a given category and query."""
     platforms = CATEGORY_WEBSITES.get(category.lower(), [])
+    frames = load_catalog(category, query, platforms, columns, price_range)
     dfs = []
     for platform in platforms:
-        file_path = f"data/processed/{platform}_{category}_{query}.csv"
-        if os.path.exists(file_path):
-            df = pd.read_csv(file_path)
+        if platform in frames:
+            df = frames[platform]
             df['platform'] = platform
             dfs.append(df)
         else:
-            print(f"[WARN] File not found: {file_path}")
+            print(f"[WARN] File not found: data/processed/{platform}_{category}_{query}")
     if dfs:
-        return pd.concat(dfs, ignore_index=True)
+        return optimize_dtypes(pd.concat(dfs, ignore_index=True))
     return pd.DataFrame()
 
 def extract_screen_size(title):
-    """Extract numeric screen size from product title, e.g., '14' or '15.6'."""
-    match = re.search(r'(\d{2,2}(\.\d)?)\s*(inch|")', title.lower())
-    if match:
-        return match.group(1)
-    # Fallback: look for patterns like "14", "15" at start or after model
-    match2 = re.search(r'\b(\d{2})\b', title)
-    return match2.group(1) if match2 else None
+    """Extract screen size in inches from product title, e.g., 14.0 or 15.6."""
+    return parse_title(title)['Screen Size']
 
 def extract_model_code(title):
-    """Extract model code from title (common patterns like e1404fa-nk5542ws)."""
-    match = re.search(r'([a-zA-Z0-9\-]{5,})', title)
-    return match.group(1) if match else None
+    """Extract model code from title (part numbers like e1404fa-nk5542ws)."""
+    return parse_title(title)['Model Code']
 
 def same_model(row1, row2):
-    """Check if two products are likely the same model."""
-    size1 = extract_screen_size(row1['Product'])
-    size2 = extract_screen_size(row2['Product'])
-    model1 = extract_model_code(row1['Product'])
-    model2 = extract_model_code(row2['Product'])
-
-    if model1 and model2:
-        return model1.lower() == model2.lower()
-    elif size1 and size2:
-        return size1 == size2
+    """Check if two products are likely the same model (the rule `candidate_blocks` applies in bulk)."""
+    a, b = parse_title(row1['Product']), parse_title(row2['Product'])
+
+    def compatible(col):
+        return a[col] is None or b[col] is None or a[col] == b[col]
+
+    if not compatible('Brand'):
+        return False
+    if a['Model Code'] and b['Model Code']:
+        return a['Model Code'] == b['Model Code']
+    elif a['CPU'] and b['CPU']:
+        return a['CPU'] == b['CPU'] and all(compatible(c) for c in ('RAM', 'Storage', 'Screen Size'))
+    elif a['Screen Size'] and b['Screen Size']:
+        return a['Screen Size'] == b['Screen Size']
     return False
 
-def match_products(df, text_threshold=85, semantic_threshold=0.75):
-    """Match products using fuzzy + semantic embeddings, with model/size filter."""
+def product_attributes(df):
+    """
+    Spec attributes per row, with None for missing values. Uses the spec
+    columns written by preprocessing and parses titles only if they are absent.
+    """
+    if all(col in df.columns for col in SPEC_COLUMNS):
+        specs = df[SPEC_COLUMNS]
+    else:
+        specs = extract_specs(df['Product'])
+    specs = specs.astype({'Screen Size': np.float32}).astype(object)
+    return specs.where(specs.notna(), None)
+
+def _split_compatible(left, right, values):
+    """
+    Split left x right (or the pairs within `left` when right is left) into
+    blocks whose pairs agree on `values` wherever both rows have a value.
+    """
+    def by_value(rows):
+        groups = {}
+        for idx in rows:
+            groups.setdefault(values[idx], []).append(idx)
+        return groups, groups.pop(None, [])
+
+    left_groups, left_none = by_value(left)
+    if right is left:
+        blocks = []
+        for rows in left_groups.values():
+            blocks.append((rows, rows))
+            if left_none:
+                blocks.append((rows, left_none))
+        if left_none:
+            blocks.append((left_none, left_none))
+        return blocks
+
+    right_groups, right_none = by_value(right)
+    blocks = [(rows, right_groups.get(value, []) + right_none) for value, rows in left_groups.items()]
+    if left_none:
+        blocks.append((left_none, right))
+    return blocks
+
+def _refine(blocks, *value_lists):
+    for values in value_lists:
+        blocks = [block for left, right in blocks for block in _split_compatible(left, right, values)]
+    return blocks
+
+def _buckets(values):
+    buckets = {}
+    for idx, value in enumerate(values):
+        if value is not None:
+            buckets.setdefault(value, []).append(idx)
+    return buckets.values()
+
+def candidate_blocks(attrs):
+    """
+    Blocking stage. Two listings are candidates when their known brands agree and
+      - both have a model code and the codes are equal, else
+      - both have a CPU, the CPUs are equal and RAM, storage and screen size
+        agree wherever both are known, else
+      - both have a screen size and the sizes are equal.
+    Returns [(left_rows, right_rows)] whose pairs are exactly the candidates;
+    a block whose two sides are the same list stands for the pairs within it.
+    """
+    codes = attrs['Model Code'].tolist()
+    cpus = attrs['CPU'].tolist()
+    sizes = attrs['Screen Size'].tolist()
+
+    blocks = [(rows, rows) for rows in _buckets(codes)]
+    for rows in _buckets(cpus):
+        codeless = [idx for idx in rows if codes[idx] is None]
+        coded = [idx for idx in rows if codes[idx] is not None]
+        blocks.extend(_refine([(codeless, codeless), (codeless, coded)],
+                              attrs['RAM'].tolist(), attrs['Storage'].tolist(), sizes))
+    for rows in _buckets(sizes):
+        # At least one side without a model code and at least one without a CPU
+        bare = [idx for idx in rows if codes[idx] is None and cpus[idx] is None]
+        rest = [idx for idx in rows if codes[idx] is not None or cpus[idx] is not None]
+        cpu_only = [idx for idx in rest if codes[idx] is None]
+        code_only = [idx for idx in rest if cpus[idx] is None]
+        blocks.extend([(bare, bare), (bare, rest), (cpu_only, code_only)])
+
+    blocks = _refine(blocks, attrs['Brand'].tolist())
+    return [(left, right) for left, right in blocks
+            if left and right and (left is not right or len(left) > 1)]
+
+def candidate_pairs(df, return_blocks=False):
+    """
+    Return {i: sorted [j > i]} for the cross-platform candidate pairs of
+    `candidate_blocks`.
+    """
+    platforms = df['platform'].tolist()
+    blocks = candidate_blocks(product_attributes(df))
+
+    pairs = set()
+    for left, right in blocks:
+        for i in left:
+            for j in right:
+                if platforms[i] != platforms[j]:
+                    pairs.add((min(i, j), max(i, j)))
+
+    candidates = {}
+    for i, j in sorted(pairs):
+        candidates.setdefault(i, []).append(j)
+    if return_blocks:
+        return candidates, blocks
+    return candidates
+
+def block_fuzzy_scores(titles, platforms, blocks, cutoff, chunk_size=1024, workers=-1):
+    """
+    Fuzzy scores for the cross-platform pairs of each block, computed as
+    platform-vs-platform `process.cdist` tiles. Scores below `cutoff` are
+    rejected early by rapidfuzz and left out of the returned {(i, j): score}.
+    Large tiles use `workers` threads (-1: all cores).
+    """
+    scores = {}
+    for left, right in blocks:
+        symmetric = left is right
+        left_by_platform, right_by_platform = {}, {}
+        for idx in left:
+            left_by_platform.setdefault(platforms[idx], []).append(idx)
+        for idx in right:
+            right_by_platform.setdefault(platforms[idx], []).append(idx)
+
+        for p, rows_a in left_by_platform.items():
+            for q, rows_b in right_by_platform.items():
+                if p == q or (symmetric and p > q):
+                    continue
+                for a0 in range(0, len(rows_a), chunk_size):
+                    tile_a = rows_a[a0:a0 + chunk_size]
+                    for b0 in range(0, len(rows_b), chunk_size):
+                        tile_b = rows_b[b0:b0 + chunk_size]
+                        matrix = process.cdist(
+                            [titles[i] for i in tile_a], [titles[j] for j in tile_b],
+                            scorer=fuzz.token_sort_ratio, score_cutoff=cutoff,
+                            workers=workers if len(tile_a) * len(tile_b) > 10_000 else 1,
+                        )
+                        for x, y in zip(*np.nonzero(matrix >= cutoff)):
+                            i, j = tile_a[x], tile_b[y]
+                            scores[(i, j) if i < j else (j, i)] = float(matrix[x, y])
+    return scores
+
+def pair_fuzzy_scores(titles, candidates, cutoff, workers=-1):
+    """Fuzzy scores for an arbitrary set of candidate pairs, in one `process.cpdist` batch."""
+    pairs = [(i, j) for i, js in candidates.items() for j in js]
+    if not pairs:
+        return {}
+    ratios = process.cpdist(
+        [titles[i] for i, _ in pairs], [titles[j] for _, j in pairs],
+        scorer=fuzz.token_sort_ratio, score_cutoff=cutoff, workers=workers,
+    )
+    return {pair: float(r) for pair, r in zip(pairs, ratios) if r >= cutoff}
+
+def semantic_matches(embeddings, platforms, candidates, threshold, chunk_size=1024):
+    """
+    Return {(i, j): score} for the candidate pairs whose cosine similarity reaches
+    `threshold`. Similarities are computed per platform pair as tiled matrix
+    products of the normalized embeddings, at most chunk_size x chunk_size
+    scores at a time, and thresholded tile by tile. Sparse embeddings must
+    already be L2-normalized.
+    """
+    sparse = hasattr(embeddings, "tocsr")
+    if sparse:
+        emb = embeddings.tocsr()
+    else:
+        emb = np.asarray(embeddings, dtype=np.float32)
+        emb = emb / np.maximum(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12)
+
+    by_platforms = {}
+    for i, js in candidates.items():
+        for j in js:
+            by_platforms.setdefault((platforms[i], platforms[j]), []).append((i, j))
+
+    passed = {}
+    for pairs in by_platforms.values():
+        pairs = np.asarray(pairs, dtype=np.int64)
+        rows_a, pos_a = np.unique(pairs[:, 0], return_inverse=True)
+        rows_b, pos_b = np.unique(pairs[:, 1], return_inverse=True)
+        tile_a, tile_b = pos_a // chunk_size, pos_b // chunk_size
+
+        order = np.lexsort((tile_b, tile_a))
+        tiles = np.stack([tile_a[order], tile_b[order]], axis=1)
+        bounds = np.flatnonzero(np.any(np.diff(tiles, axis=0) != 0, axis=1)) + 1
+        for block in np.split(order, bounds):
+            a0 = tile_a[block[0]] * chunk_size
+            b0 = tile_b[block[0]] * chunk_size
+            scores = emb[rows_a[a0:a0 + chunk_size]] @ emb[rows_b[b0:b0 + chunk_size]].T
+            if sparse:
+                scores = scores.toarray()
+            block_scores = scores[pos_a[block] - a0, pos_b[block] - b0]
+            keep = block_scores >= threshold
+            hits = block[keep]
+            passed.update(zip(zip(pairs[hits, 0].tolist(), pairs[hits, 1].tolist()),
+                              block_scores[keep].tolist()))
+    return passed
+
+def score_edges(titles, platforms, candidates, embeddings, text_threshold, semantic_threshold,
+                fuzzy=None, fuzzy_workers=-1):
+    """
+    Score candidate pairs into (i, j, score) edges: fuzzy ratio first, semantic
+    fallback. `fuzzy` takes precomputed {(i, j): ratio} scores (see
+    block_fuzzy_scores); otherwise the pairs are scored in one batch on
+    `fuzzy_workers` threads (-1: all cores; pass 1 inside a process pool).
+    """
+    if fuzzy is None:
+        fuzzy = pair_fuzzy_scores(titles, candidates, text_threshold, fuzzy_workers)
+    semantic = semantic_matches(embeddings, platforms, candidates, semantic_threshold)
+    edges = []
+    for i, js in candidates.items():
+        for j in js:
+            if (i, j) in fuzzy:
+                edges.append((i, j, fuzzy[(i, j)] / 100))
+            elif (i, j) in semantic:
+                edges.append((i, j, semantic[(i, j)]))
+    return edges
+
+class UnionFind:
+    """Disjoint sets over row indices, with path halving and union by size."""
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, x):
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+
+def prune_edges(edges, max_edges_per_node):
+    """Keep an edge only if it is among the strongest `max_edges_per_node` of both its rows."""
+    ranked = {}
+    for i, j, score in edges:
+        ranked.setdefault(i, []).append((-score, j))
+        ranked.setdefault(j, []).append((-score, i))
+    top = {node: {other for _, other in sorted(links)[:max_edges_per_node]}
+           for node, links in ranked.items()}
+    return [(i, j, score) for i, j, score in edges if j in top[i] and i in top[j]]
+
+def cluster_edges(n, edges):
+    """
+    Connected components of the match graph. Groups are numbered in order of
+    their first row, so ids do not depend on the order edges were scored in.
+    """
+    components = UnionFind(n)
+    for i, j, _ in edges:
+        components.union(i, j)
+
+    group_ids, labels = [], {}
+    for row in range(n):
+        root = components.find(row)
+        if root not in labels:
+            labels[root] = len(labels)
+        group_ids.append(labels[root])
+    return group_ids
+
+def match_products(df, text_threshold=85, semantic_threshold=None, backend="transformer",
+                   max_edges_per_node=None, fuzzy_workers=-1):
+    """
+    Match products using fuzzy + semantic embeddings within model/size blocks.
+    `backend` is a name from embedding_backends.BACKENDS or a backend instance;
+    semantic_threshold defaults to the backend's own threshold. Matching pairs
+    form a graph whose connected components become groups; set
+    max_edges_per_node to prune weak links before clustering. fuzzy_workers
+    is the rapidfuzz thread count (-1: all cores).
+    """
+    if isinstance(backend, str):
+        backend = get_backend(backend)
+    if semantic_threshold is None:
+        semantic_threshold = backend.threshold
     df = df.reset_index(drop=True)
-    df['group_id'] = None
-    df['matched'] = False
-    group_counter = 0
-
-    embeddings = MODEL.encode(df['Product'].tolist(), convert_to_tensor=True)
-
-    for i, row in df.iterrows():
-        if df.at[i, 'group_id'] is not None:
-            continue
-
-        df.at[i, 'group_id'] = group_counter
-        df.at[i, 'matched'] = False
-        current_platform = row['platform']
-
-        for j, other_row in df.iloc[i+1:].iterrows():
-            if df.at[j, 'group_id'] is not None:
-                continue
-            if other_row['platform'] == current_platform:
-                continue
-
-            # Only match if model/size matches
-            if same_model(row, other_row):
-                # Fuzzy matching
-                ratio = fuzz.token_sort_ratio(row['Product'], other_row['Product'])
-                if ratio >= text_threshold:
-                    df.at[j, 'group_id'] = group_counter
-                    df.at[j, 'matched'] = True
-                    df.at[i, 'matched'] = True
-                else:
-                    # Semantic fallback
-                    sim_score = util.pytorch_cos_sim(embeddings[i], embeddings[j]).item()
-                    if sim_score >= semantic_threshold:
-                        df.at[j, 'group_id'] = group_counter
-                        df.at[j, 'matched'] = True
-                        df.at[i, 'matched'] = True
-
-        group_counter += 1
+    candidates, blocks = candidate_pairs(df, return_blocks=True)
+    titles = df['Product'].astype(str).tolist()
+    platforms = df['platform'].tolist()
+
+    embeddings = backend.encode(titles)
+    fuzzy = block_fuzzy_scores(titles, platforms, blocks, text_threshold, workers=fuzzy_workers)
+    edges = score_edges(titles, platforms, candidates, embeddings,
+                        text_threshold, semantic_threshold, fuzzy=fuzzy)
+
+    if max_edges_per_node:
+        edges = prune_edges(edges, max_edges_per_node)
 
+    group_ids = cluster_edges(len(df), edges)
+    sizes = pd.Series(group_ids).value_counts()
+    df['group_id'] = group_ids
+    df['matched'] = pd.Series(group_ids).map(sizes).gt(1).to_numpy()
     return df
 
-def save_matched_products(df, category, query):
-    os.makedirs("data/matched", exist_ok=True)
-    file_path = f"data/matched/{category}_{query}_matched.csv"
-    df.to_csv(file_path, index=False)
+def save_matched_products(df, category, query, fmt=DEFAULT_FORMAT):
+    file_path = table_path(f"data/matched/{category}_{query}_matched", fmt)
+    write_table(df, file_path)
     print(f"[INFO] Matched products saved to {file_path}")
     print(f"[INFO] Total matched products: {df['matched'].sum()} / {len(df)}")
 
-def main(category, query):
+def main(category, query, backend="transformer", incremental=False, fmt=DEFAULT_FORMAT, fuzzy_workers=-1):
     df = load_processed_data(category, query)
     if df.empty:
         print("[WARN] No products found for this query/category.")
         return
-    df_matched = match_products(df)
-    save_matched_products(df_matched, category, query)
+    if incremental:
+        from analysis.match_state import match_incremental
+        df_matched = match_incremental(df, category, query, backend=backend, fuzzy_workers=fuzzy_workers)
+    else:
+        df_matched = match_products(df, backend=backend, fuzzy_workers=fuzzy_workers)
+    save_matched_products(df_matched, category, query, fmt)
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Match products across platforms")
     parser.add_argument("--category", required=True, help="Product category")
     parser.add_argument("--query", required=True, help="Search query")
+    parser.add_argument("--backend", default="transformer", choices=sorted(BACKENDS),
+                        help="Embedding backend for the semantic fallback")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only match new or changed listings against the saved match state")
+    parser.add_argument("--format", default=DEFAULT_FORMAT, choices=FORMATS,
+                        help="Storage format of the matched table")
     args = parser.parse_args()
 
-    main(args.category, args.query)
+    main(args.category, args.query, args.backend, args.incremental, args.format)
@@ -0,0 +1,105 @@
+# analysis/embedding_backends.py
+"""
+Embedding backends for the semantic fallback in match_products.
+
+A backend turns a list of titles into one row vector per title and carries
+the cosine threshold that suits its vectors. `encode` returns either a
+dense float32 array or an L2-normalized scipy sparse matrix.
+
+    transformer       SentenceTransformer embeddings, cached on disk
+    transformer-int8  same model with Linear layers quantized to int8 (CPU)
+    char-ngram        hashed character n-gram TF(-IDF), no model weights needed
+"""
+import numpy as np
+from analysis.embedding_cache import EmbeddingCache
+from utils.lazy import LazyResource, lazy_attr, lazy_import
+
+SentenceTransformer = lazy_attr("sentence_transformers", "SentenceTransformer")
+HashingVectorizer = lazy_attr("sklearn.feature_extraction.text", "HashingVectorizer")
+TfidfTransformer = lazy_attr("sklearn.feature_extraction.text", "TfidfTransformer")
+torch = lazy_import("torch")
+
+DEFAULT_MODEL = 'all-MiniLM-L6-v2'
+
+
+class TransformerBackend:
+    """SentenceTransformer embeddings, encoded only for titles not in the cache."""
+    name = "transformer"
+    threshold = 0.75
+
+    def __init__(self, model_name=DEFAULT_MODEL, batch_size=256, use_cache=True):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.use_cache = use_cache
+        self.model = LazyResource(self._load_model, model_name)
+        self.cache = LazyResource(lambda: EmbeddingCache(self.cache_name), "EmbeddingCache")
+
+    @property
+    def cache_name(self):
+        return self.model_name
+
+    def _load_model(self):
+        return SentenceTransformer(self.model_name)
+
+    def encode(self, titles):
+        if not self.use_cache:
+            return self.model.encode(list(titles), batch_size=self.batch_size)
+        return self.cache.encode(
+            titles,
+            lambda batch: self.model.encode(batch, batch_size=self.batch_size),
+            batch_size=self.batch_size,
+        )
+
+
+class QuantizedTransformerBackend(TransformerBackend):
+    """The transformer backend with dynamic int8 quantization of its Linear layers."""
+    name = "transformer-int8"
+
+    @property
+    def cache_name(self):
+        return f"{self.model_name}-int8"
+
+    def _load_model(self):
+        model = SentenceTransformer(self.model_name, device="cpu")
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class CharNgramBackend:
+    """
+    Hashed character n-gram vectors. IDF weighting is off by default: a single
+    query's titles are too few for stable document frequencies, and plain
+    term frequencies keep vectors independent of the rest of the run.
+    """
+    name = "char-ngram"
+    threshold = 0.35
+
+    def __init__(self, ngram_range=(3, 5), n_features=2 ** 20, use_idf=False):
+        self.ngram_range = ngram_range
+        self.n_features = n_features
+        self.use_idf = use_idf
+
+    def encode(self, titles):
+        vectorizer = HashingVectorizer(analyzer="char_wb", ngram_range=self.ngram_range,
+                                       n_features=self.n_features, alternate_sign=False,
+                                       norm=None if self.use_idf else "l2", dtype=np.float32)
+        vectors = vectorizer.transform([str(t).lower() for t in titles])
+        if self.use_idf:
+            vectors = TfidfTransformer(sublinear_tf=True).fit_transform(vectors)
+        return vectors
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (TransformerBackend, QuantizedTransformerBackend, CharNgramBackend)
+}
+
+_instances = {}
+
+
+def get_backend(name="transformer"):
+    """Return the shared instance of the named backend."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{name}', choose from {sorted(BACKENDS)}")
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
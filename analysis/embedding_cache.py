@@ -0,0 +1,184 @@
+# analysis/embedding_cache.py
+"""
+Persistent embedding store for product titles.
+
+Vectors live in a fixed-capacity float32 matrix that is memory-mapped from
+`{cache_dir}/{model}.f32`; `{model}.index.json` maps each key (a hash of the
+model name and the normalized title) to its row and last-use tick. When the
+store is full the least recently used rows are overwritten.
+
+Several processes may share a store (analysis.parallel_matching runs one
+job per process). Every read-modify-write of the index and matrix holds an
+exclusive lock on `{model}.lock` (flock on POSIX, msvcrt.locking on
+Windows) and starts from the files on disk, so no process overwrites rows
+or index entries written by another. Titles are encoded outside the lock.
+"""
+import hashlib
+import json
+import os
+import re
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # retries for ~10 s, then raises
+            return
+        except OSError:
+            continue
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+        return
+    f.seek(0)
+    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def normalize_title(title):
+    """Lowercase and collapse whitespace so trivial edits share a key."""
+    return re.sub(r"\s+", " ", str(title).lower()).strip()
+
+
+def title_key(title, model_name):
+    return hashlib.sha1(f"{model_name}\0{normalize_title(title)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+
+    def __init__(self, model_name, cache_dir="data/embeddings", max_entries=100_000):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        slug = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        self.matrix_path = os.path.join(cache_dir, f"{slug}.f32")
+        self.index_path = os.path.join(cache_dir, f"{slug}.index.json")
+        self.lock_path = os.path.join(cache_dir, f"{slug}.lock")
+
+        self.dim = None
+        self.tick = 0
+        self.entries = {}  # key -> [slot, last_used]
+        self.matrix = None
+        if os.path.exists(self.index_path):
+            with self._locked():
+                self._load()
+
+    @contextmanager
+    def _locked(self):
+        """Hold the store's exclusive lock (shared with other processes)."""
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        with open(self.lock_path, "a+") as lock:
+            _lock_file(lock)
+            try:
+                yield
+            finally:
+                _unlock_file(lock)
+
+    def _load(self):
+        """Read the store from disk (call with the lock held)."""
+        if not (os.path.exists(self.index_path) and os.path.exists(self.matrix_path)):
+            return
+        with open(self.index_path, encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("max_entries") != self.max_entries:
+            print(f"[WARN] Embedding cache size changed, rebuilding {self.matrix_path}")
+            return
+        self.dim = index["dim"]
+        self.tick = index["tick"]
+        self.entries = index["entries"]
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+",
+                                shape=(self.max_entries, self.dim))
+
+    def _create(self, dim):
+        os.makedirs(os.path.dirname(self.matrix_path) or ".", exist_ok=True)
+        self.dim = dim
+        self.entries = {}
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="w+",
+                                shape=(self.max_entries, self.dim))
+
+    def _save(self):
+        self.matrix.flush()
+        index = {
+            "model": self.model_name,
+            "dim": self.dim,
+            "max_entries": self.max_entries,
+            "tick": self.tick,
+            "entries": self.entries,
+        }
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _free_slots(self, count, keep):
+        """Return `count` slots, evicting least recently used keys not in `keep`."""
+        used = {slot for slot, _ in self.entries.values()}
+        slots = [s for s in range(self.max_entries) if s not in used][:count]
+        if len(slots) < count:
+            victims = sorted((k for k in self.entries if k not in keep),
+                             key=lambda k: self.entries[k][1])
+            for key in victims[:count - len(slots)]:
+                slots.append(self.entries.pop(key)[0])
+        return slots
+
+    def encode(self, titles, encode_fn, batch_size=256):
+        """
+        Return an (n, dim) float32 array of embeddings for `titles`, calling
+        `encode_fn(list_of_titles)` only for titles missing from the store.
+        """
+        keys = [title_key(t, self.model_name) for t in titles]
+        texts = dict(zip(keys, map(str, titles)))
+        with self._locked():
+            self._load()
+            misses = [key for key in texts if key not in self.entries]
+        fresh = self._encode(misses, texts, encode_fn, batch_size)
+
+        with self._locked():
+            # Other processes may have added or evicted rows while we encoded
+            self._load()
+            lost = [key for key in texts if key not in self.entries and key not in fresh]
+            fresh.update(self._encode(lost, texts, encode_fn, batch_size))
+
+            if fresh and self.matrix is None:
+                self._create(len(next(iter(fresh.values()))))
+            if self.matrix is None:
+                return np.zeros((0, 0), dtype=np.float32)
+
+            self.tick += 1
+            new = [key for key in fresh if key not in self.entries]
+            slots = self._free_slots(min(len(new), self.max_entries), keep=set(keys))
+            for key, slot in zip(new, slots):
+                self.matrix[slot] = fresh[key]
+                self.entries[key] = [slot, self.tick]
+
+            out = np.empty((len(keys), self.dim), dtype=np.float32)
+            for row, key in enumerate(keys):
+                if key in fresh:
+                    out[row] = fresh[key]
+                else:
+                    out[row] = self.matrix[self.entries[key][0]]
+                if key in self.entries:
+                    self.entries[key][1] = self.tick
+            self._save()
+        print(f"[INFO] Embedding cache: {len(keys) - len(fresh)} hits, {len(fresh)} encoded")
+        return out
+
+    def _encode(self, keys, texts, encode_fn, batch_size):
+        fresh = {}
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            vectors = np.asarray(encode_fn([texts[k] for k in batch]), dtype=np.float32)
+            fresh.update(zip(batch, vectors))
+        return fresh
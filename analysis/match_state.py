@@ -0,0 +1,264 @@
+# analysis/match_state.py
+"""
+Incremental matching for analysis.comparision.
+
+The state of the last run is kept in data/matched/state/{category}_{query}/:
+
+    listings.csv   one row per listing key (Product ID, or a hash of platform
+                   and title) with its price and group_id
+    groups.csv     group_id, representative title and platforms, in centroid order
+    centroids.npy  L2-normalized mean embedding of each group
+                   (centroids.npz when the backend returns sparse vectors)
+    meta.json      embedding backend and the next free group id
+
+On refresh, listings whose key is new or whose price changed are scored
+against each other and against the existing groups (representative title
+for the fuzzy test, centroid for the semantic test). Listings that
+disappeared are retired, and each group they leave is re-clustered from
+its remaining members the way match_products would, so members no longer
+linked (or left on a single platform) split off. Unchanged listings keep
+their group otherwise.
+"""
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from analysis.comparision import (
+    UnionFind, candidate_pairs, cluster_edges, get_backend, score_edges,
+)
+
+STATE_DIR = "data/matched/state"
+GROUP_PLATFORM = "__group__"
+
+
+def listing_key(platform, title):
+    text = f"{platform}\0{' '.join(str(title).lower().split())}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def listing_keys(df):
+    """Product ID where the listing has one, else listing_key of platform and title."""
+    keys = pd.Series([listing_key(p, t) for p, t in zip(df["platform"], df["Product"])],
+                     index=df.index, dtype=object)
+    if "Product ID" in df.columns:
+        keys = df["Product ID"].astype(object).where(df["Product ID"].notna(), keys)
+    return keys
+
+
+def normalize_rows(vectors):
+    """L2-normalize the rows of a dense array or sparse matrix."""
+    if sparse.issparse(vectors):
+        norms = np.sqrt(np.asarray(vectors.multiply(vectors).sum(axis=1))).ravel()
+        return sparse.diags(1 / np.maximum(norms, 1e-12)) @ vectors.tocsr()
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def stack_rows(blocks):
+    if any(sparse.issparse(b) for b in blocks):
+        return sparse.vstack([sparse.csr_matrix(b) for b in blocks]).tocsr()
+    return np.vstack(blocks)
+
+
+class MatchState:
+
+    def __init__(self, category, query, backend_name):
+        self.path = os.path.join(STATE_DIR, f"{category}_{query}")
+        self.backend_name = backend_name
+        self.listings = pd.DataFrame(columns=["key", "platform", "Product", "Price", "group_id"])
+        self.groups = pd.DataFrame(columns=["group_id", "representative", "platforms"])
+        self.centroids = None
+        self.next_group_id = 0
+
+    @classmethod
+    def load(cls, category, query, backend_name):
+        state = cls(category, query, backend_name)
+        meta_path = os.path.join(state.path, "meta.json")
+        if not os.path.exists(meta_path):
+            return state
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["backend"] != backend_name:
+            print(f"[WARN] Match state was built with '{meta['backend']}', rematching from scratch")
+            return state
+
+        state.next_group_id = meta["next_group_id"]
+        state.listings = pd.read_csv(os.path.join(state.path, "listings.csv"), dtype={"key": str})
+        state.groups = pd.read_csv(os.path.join(state.path, "groups.csv"), keep_default_na=False)
+        if os.path.exists(os.path.join(state.path, "centroids.npz")):
+            state.centroids = sparse.load_npz(os.path.join(state.path, "centroids.npz")).tocsr()
+        elif os.path.exists(os.path.join(state.path, "centroids.npy")):
+            state.centroids = np.load(os.path.join(state.path, "centroids.npy"))
+        return state
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        self.listings.to_csv(os.path.join(self.path, "listings.csv"), index=False)
+        self.groups.to_csv(os.path.join(self.path, "groups.csv"), index=False)
+        for name in ("centroids.npy", "centroids.npz"):
+            if os.path.exists(os.path.join(self.path, name)):
+                os.remove(os.path.join(self.path, name))
+        if self.centroids is not None and sparse.issparse(self.centroids):
+            sparse.save_npz(os.path.join(self.path, "centroids.npz"), self.centroids)
+        elif self.centroids is not None:
+            np.save(os.path.join(self.path, "centroids.npy"), self.centroids)
+        with open(os.path.join(self.path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"backend": self.backend_name, "next_group_id": self.next_group_id}, f)
+
+    def split_groups(self, group_ids, backend, text_threshold, semantic_threshold, fuzzy_workers=-1):
+        """
+        Re-cluster the remaining members of the given groups from their own
+        edges (score_edges + cluster_edges, as in match_products). The
+        component holding a group's first member keeps its id; the others
+        get new ids, which are returned.
+        """
+        created = set()
+        for group_id in sorted(group_ids):
+            mask = (self.listings["group_id"] == group_id).to_numpy()
+            if mask.sum() < 2:
+                continue
+            members = self.listings[mask].reset_index(drop=True)
+            candidates = candidate_pairs(members)
+            edges = []
+            if candidates:
+                titles = members["Product"].astype(str).tolist()
+                edges = score_edges(titles, members["platform"].tolist(), candidates, backend.encode(titles),
+                                    text_threshold, semantic_threshold, fuzzy_workers=fuzzy_workers)
+            labels = cluster_edges(len(members), edges)
+            new_ids = {0: group_id}
+            for label in sorted(set(labels) - {0}):
+                new_ids[label] = self.next_group_id
+                created.add(self.next_group_id)
+                self.next_group_id += 1
+            self.listings.loc[mask, "group_id"] = [new_ids[label] for label in labels]
+        return created
+
+    def refresh_groups(self, group_ids, backend):
+        """Recompute representative, platforms and centroid for the given groups."""
+        group_ids = set(group_ids)
+        keep = ~self.groups["group_id"].isin(group_ids).to_numpy()
+        kept_groups = self.groups[keep]
+        kept_centroids = self.centroids[np.flatnonzero(keep)] if self.centroids is not None else None
+
+        members = self.listings[self.listings["group_id"].isin(group_ids)]
+        if members.empty:
+            self.groups = kept_groups.reset_index(drop=True)
+            self.centroids = kept_centroids
+            return
+
+        previous = dict(zip(self.groups["group_id"], self.groups["representative"]))
+        rows = []
+        for group_id, group in members.groupby("group_id", sort=True):
+            titles = group["Product"].tolist()
+            rep = previous.get(group_id)
+            rows.append({
+                "group_id": group_id,
+                "representative": rep if rep in titles else titles[0],
+                "platforms": "|".join(sorted(group["platform"].unique())),
+            })
+        fresh = pd.DataFrame(rows)
+
+        # Mean member vector per group through a sparse group x member indicator
+        vectors = backend.encode(members["Product"].tolist())
+        row_of = {g: r for r, g in enumerate(fresh["group_id"])}
+        indicator = sparse.csr_matrix((
+            np.ones(len(members), dtype=np.float32),
+            ([row_of[g] for g in members["group_id"]], np.arange(len(members))),
+        ), shape=(len(fresh), len(members)))
+        centroids = normalize_rows(indicator @ vectors)
+
+        self.groups = pd.concat([kept_groups, fresh], ignore_index=True)
+        self.centroids = centroids if kept_centroids is None or not len(kept_groups) \
+            else stack_rows([kept_centroids, centroids])
+
+
+def match_incremental(df, category, query, text_threshold=85, semantic_threshold=None,
+                      backend="transformer", fuzzy_workers=-1):
+    """
+    Match only new or price-changed listings against the saved groups and each
+    other, retire listings that disappeared, and return the full frame with
+    group_id and matched columns as produced by match_products.
+    """
+    backend_name = backend if isinstance(backend, str) else backend.name
+    if isinstance(backend, str):
+        backend = get_backend(backend)
+    if semantic_threshold is None:
+        semantic_threshold = backend.threshold
+
+    df = df.reset_index(drop=True)
+    df["key"] = listing_keys(df)
+    current = df.drop_duplicates("key")[["key", "platform", "Product", "Price"]]
+
+    state = MatchState.load(category, query, backend_name)
+    previous = state.listings.set_index("key")
+    old_price = current["key"].map(previous["Price"]) if len(previous) else pd.Series(np.nan, index=current.index)
+    fresh = current[old_price.isna() | (old_price != current["Price"])]
+    stale_keys = set(previous.index) - (set(current["key"]) - set(fresh["key"]))
+    touched = set(previous.loc[list(stale_keys), "group_id"]) if stale_keys else set()
+    state.listings = state.listings[~state.listings["key"].isin(stale_keys)]
+    touched |= state.split_groups(touched, backend, text_threshold, semantic_threshold, fuzzy_workers)
+    state.refresh_groups(touched, backend)
+    retired = len(set(previous.index) - set(current["key"]))
+    print(f"[INFO] Incremental match: {len(fresh)} new/changed, {retired} retired, "
+          f"{len(current) - len(fresh)} unchanged")
+
+    # Nodes: existing groups first, then the fresh listings
+    groups = state.groups
+    n_groups = len(groups)
+    nodes = pd.concat([
+        pd.DataFrame({"Product": groups["representative"], "platform": GROUP_PLATFORM}),
+        fresh[["Product", "platform"]],
+    ], ignore_index=True)
+    group_platforms = [set(p.split("|")) for p in groups["platforms"]]
+    platforms = nodes["platform"].tolist()
+
+    candidates = {}
+    for i, js in candidate_pairs(nodes).items():
+        for j in js:
+            if j < n_groups:
+                continue  # two existing groups
+            if i < n_groups and group_platforms[i] == {platforms[j]}:
+                continue  # group holds only this listing's platform
+            candidates.setdefault(i, []).append(j)
+
+    fresh_vectors = backend.encode(fresh["Product"].tolist()) if len(fresh) else None
+    blocks = [b for b in (state.centroids if n_groups else None, fresh_vectors) if b is not None]
+    edges = []
+    if candidates and blocks:
+        edges = score_edges(nodes["Product"].astype(str).tolist(), platforms, candidates,
+                            stack_rows(blocks), text_threshold, semantic_threshold,
+                            fuzzy_workers=fuzzy_workers)
+
+    components = UnionFind(len(nodes))
+    for i, j, _ in edges:
+        components.union(i, j)
+    members = {}
+    for node in range(len(nodes)):
+        members.setdefault(components.find(node), []).append(node)
+
+    assigned, remap = {}, {}
+    for nodes_in in sorted(members.values()):
+        old = [int(groups["group_id"].iloc[n]) for n in nodes_in if n < n_groups]
+        if old:
+            target = min(old)
+            remap.update({g: target for g in old if g != target})
+        else:
+            target = state.next_group_id
+            state.next_group_id += 1
+        for n in nodes_in:
+            if n >= n_groups:
+                assigned[fresh["key"].iloc[n - n_groups]] = target
+
+    added = fresh.assign(group_id=fresh["key"].map(assigned))
+    state.listings = pd.concat([state.listings, added], ignore_index=True)
+    state.listings["group_id"] = state.listings["group_id"].replace(remap).astype(int)
+    state.refresh_groups(set(added["group_id"]) | set(remap) | set(remap.values()), backend)
+    state.save()
+
+    group_of = dict(zip(state.listings["key"], state.listings["group_id"]))
+    df["group_id"] = df["key"].map(group_of).astype(int)
+    group_sizes = state.listings["group_id"].value_counts()
+    df["matched"] = df["group_id"].map(group_sizes).gt(1).to_numpy()
+    return df.drop(columns="key")
@@ -0,0 +1,195 @@
+# analysis/parallel_matching.py
+"""
+Multi-core driver for analysis.comparision.
+
+Two ways to shard the work over a process pool:
+
+    match_products_parallel(df)   one catalog, sharded by candidate block.
+                                  Embeddings are encoded once and shared
+                                  with the workers through shared memory;
+                                  workers return scored edges, which are
+                                  merged in shard order and clustered.
+    run_jobs([(category, query)]) one (category, query) per task, each
+                                  running comparision.main end to end.
+
+    python -m analysis.parallel_matching --category electronics --query "macbook air " --workers 16
+    python -m analysis.parallel_matching --jobs-file jobs.csv --workers 16
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from scipy import sparse
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+from analysis.comparision import (
+    BACKENDS, candidate_pairs, cluster_edges, get_backend, main as match_one,
+    load_processed_data, prune_edges, save_matched_products, score_edges,
+)
+
+# Set in each worker by _init_worker
+_WORKER = {}
+
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def _share(array):
+    """Copy an array into a new shared memory block; return (block, spec)."""
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+
+def _attach(spec):
+    name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+
+
+def share_embeddings(embeddings):
+    """Place dense or CSR embeddings in shared memory; return (blocks, spec)."""
+    if sparse.issparse(embeddings):
+        csr = embeddings.tocsr()
+        shared = [_share(a) for a in (csr.data, csr.indices, csr.indptr)]
+        return [b for b, _ in shared], ("csr", [s for _, s in shared], csr.shape)
+    block, spec = _share(np.asarray(embeddings, dtype=np.float32))
+    return [block], ("dense", [spec], None)
+
+
+def attach_embeddings(spec):
+    kind, specs, shape = spec
+    attached = [_attach(s) for s in specs]
+    arrays = [a for _, a in attached]
+    if kind == "csr":
+        return [b for b, _ in attached], sparse.csr_matrix(tuple(arrays), shape=shape, copy=False)
+    return [b for b, _ in attached], arrays[0]
+
+
+def _limit_threads():
+    """Pin a pool worker's numeric libraries to one thread so the workers don't oversubscribe the cores."""
+    # Libraries loaded from here on read the environment...
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = "1"
+    # ...but numpy/scipy's BLAS came with the fork, already sized for every core
+    if threadpool_limits is not None:
+        threadpool_limits(1)
+
+
+def _init_worker(titles, platforms, embeddings_spec, text_threshold, semantic_threshold):
+    _limit_threads()
+    blocks, embeddings = attach_embeddings(embeddings_spec)
+    _WORKER.update(blocks=blocks, titles=titles, platforms=platforms, embeddings=embeddings,
+                   text_threshold=text_threshold, semantic_threshold=semantic_threshold)
+
+
+def _score_shard(shard):
+    return score_edges(_WORKER["titles"], _WORKER["platforms"], dict(shard), _WORKER["embeddings"],
+                       _WORKER["text_threshold"], _WORKER["semantic_threshold"], fuzzy_workers=1)
+
+
+def shard_candidates(candidates, shard_pairs):
+    """Split {i: [j, ...]} into consecutive shards of about `shard_pairs` pairs."""
+    shards, current, size = [], [], 0
+    for i in sorted(candidates):
+        current.append((i, candidates[i]))
+        size += len(candidates[i])
+        if size >= shard_pairs:
+            shards.append(current)
+            current, size = [], 0
+    if current:
+        shards.append(current)
+    return shards
+
+
+def match_products_parallel(df, workers=None, text_threshold=85, semantic_threshold=None,
+                            backend="transformer", max_edges_per_node=None, shard_pairs=20_000):
+    """Same result as comparision.match_products, with pair scoring spread over processes."""
+    if isinstance(backend, str):
+        backend = get_backend(backend)
+    if semantic_threshold is None:
+        semantic_threshold = backend.threshold
+    df = df.reset_index(drop=True)
+    candidates = candidate_pairs(df)
+    titles = df['Product'].astype(str).tolist()
+    platforms = df['platform'].tolist()
+    embeddings = backend.encode(titles)
+
+    shards = shard_candidates(candidates, shard_pairs)
+    blocks, spec = share_embeddings(embeddings)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(titles, platforms, spec, text_threshold, semantic_threshold),
+        ) as pool:
+            edges = [edge for shard_edges in pool.map(_score_shard, shards) for edge in shard_edges]
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    if max_edges_per_node:
+        edges = prune_edges(edges, max_edges_per_node)
+
+    group_ids = cluster_edges(len(df), edges)
+    sizes = pd.Series(group_ids).value_counts()
+    df['group_id'] = group_ids
+    df['matched'] = pd.Series(group_ids).map(sizes).gt(1).to_numpy()
+    return df
+
+
+def _run_job(job):
+    category, query, backend, incremental = job
+    start = time.perf_counter()
+    try:
+        match_one(category, query, backend, incremental, fuzzy_workers=1)
+        error = None
+    except Exception as e:
+        error = str(e)
+    return {"category": category, "query": query, "seconds": time.perf_counter() - start, "error": error}
+
+
+def run_jobs(jobs, workers=None, backend="transformer", incremental=False):
+    """Match each (category, query) in its own process; results come back in job order."""
+    tasks = [(category, query, backend, incremental) for category, query in jobs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_limit_threads) as pool:
+        results = list(pool.map(_run_job, tasks))
+    for r in results:
+        status = f"failed: {r['error']}" if r["error"] else "ok"
+        print(f"[INFO] {r['category']}/{r['query']}: {status} ({r['seconds']:.1f}s)")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Match products across platforms on several cores")
+    parser.add_argument("--category", help="Product category (block-sharded run)")
+    parser.add_argument("--query", help="Search query (block-sharded run)")
+    parser.add_argument("--jobs-file", help="CSV with category,query columns (one job per row)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--backend", default="transformer", choices=sorted(BACKENDS),
+                        help="Embedding backend for the semantic fallback")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Use the saved match state (jobs-file runs only)")
+    args = parser.parse_args()
+
+    # Workers must resolve the task functions by module name, not via __main__
+    from analysis.parallel_matching import match_products_parallel, run_jobs
+
+    if args.jobs_file:
+        jobs = pd.read_csv(args.jobs_file)[["category", "query"]].itertuples(index=False, name=None)
+        run_jobs(list(jobs), args.workers, args.backend, args.incremental)
+    elif args.category and args.query:
+        df = load_processed_data(args.category, args.query)
+        if df.empty:
+            print("[WARN] No products found for this query/category.")
+        else:
+            df_matched = match_products_parallel(df, args.workers, backend=args.backend)
+            save_matched_products(df_matched, args.category, args.query)
+    else:
+        parser.error("pass --jobs-file or both --category and --query")
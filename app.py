@@ -1,9 +1,17 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import os
 import glob
 import re
+import uuid
+from utils.catalog_cache import read_cached
 from utils.data_cleaning import preprocess_all
+from utils.dtypes import optimize_dtypes
+from utils.storage import EXTENSIONS, load_catalog
+from utils.token_index import TokenIndex
+from product_matching.grouping import pivot_by_site, site_price_columns
+from product_matching.search import SearchEngine
 from jobs.scrape_by_category import scrape_by_category
 
 # --- Page Config ---
@@ -16,11 +24,11 @@ query = st.text_input("Enter Product Query", "")
 
 # --- Helper: Cleanup function ---
 def cleanup_data_folders():
-    """Delete all CSV files in /data/raw and /data/processed"""
+    """Delete all raw CSVs and processed tables in /data/raw and /data/processed"""
     raw_dir = os.path.join(os.path.dirname(__file__), "data", "raw")
     processed_dir = os.path.join(os.path.dirname(__file__), "data/processed")
     for folder in [raw_dir, processed_dir]:
-        files = glob.glob(os.path.join(folder, "*.csv"))
+        files = [f for ext in EXTENSIONS.values() for f in glob.glob(os.path.join(folder, f"*{ext}"))]
         for f in files:
             try:
                 os.remove(f)
@@ -39,108 +47,169 @@ def load_processed_data(category, query):
     websites = CATEGORY_WEBSITES.get(category, [])
     all_data = []
 
-    for site in websites:
-        file_pattern = f"data/processed/{site}_{category}_{query}.csv"
-        for file in glob.glob(file_pattern):
-            df_site = pd.read_csv(file)
-            df_site.columns = [col.strip().capitalize() for col in df_site.columns]
-            df_site["Website"] = site
-            all_data.append(df_site)
+    for site, df_site in load_catalog(category, query, websites, reader=read_cached).items():
+        df_site.columns = [col.strip().capitalize() for col in df_site.columns]
+        df_site["Website"] = site
+        all_data.append(df_site)
 
     if all_data:
-        return pd.concat(all_data, ignore_index=True)
+        return optimize_dtypes(pd.concat(all_data, ignore_index=True))
     return pd.DataFrame()
 
 
 # --- Step 1: Query Filtering ---
-def filter_by_query(df, query):
-    """Keep all products whose names contain all query words (case-insensitive)"""
+def filter_by_query(df, query, index=None):
+    """Keep all products whose names contain all query words (case-insensitive, see utils.token_index)"""
     if df.empty or not query:
         return df
 
-    query_tokens = set(query.lower().split())
+    if index is None:
+        index = TokenIndex(df["Product"])
+    return df.iloc[index.lookup(query)]
 
-    def matches(row):
-        name_tokens = set(str(row["Product"]).lower().split())
-        return query_tokens.issubset(name_tokens)
+# --- Facet summaries: the values each sidebar filter offers ---
+SPEC_FILTERS = [("Brand", "Brand"), ("Cpu", "CPU"), ("Ram", "RAM (GB)"), ("Storage", "Storage (GB)")]
+
+
+def facet_summary(df):
+    """Min/max price and the distinct values of every filterable column"""
+    facets = {}
+    if "Website" in df.columns:
+        facets["Website"] = sorted(df["Website"].dropna().astype(str).unique().tolist())
+    if "Price" in df.columns and df["Price"].notna().any():
+        facets["Price"] = (int(df["Price"].min()), int(df["Price"].max()))
+    for col in ["Discount", "Rating"] + [col for col, _ in SPEC_FILTERS]:
+        if col in df.columns:
+            facets[col] = sorted(df[col].dropna().unique().tolist())
+    return facets
 
-    return df[df.apply(matches, axis=1)]
 
 #dynamic filtering
-def apply_filters(df, original_df=None):
-    """Apply dynamic filters using the sidebar"""
-    if original_df is None:
-        original_df = df.copy()  # fallback if not provided
+def filter_selections(facets):
+    """Sidebar filter widgets built from precomputed facets; returns the selections"""
+    selections = {}
+    if "Website" in facets:
+        selections["Website"] = st.sidebar.multiselect("Filter by Website", facets["Website"], key="website_filter")
+    if "Price" in facets:
+        min_price, max_price = facets["Price"]
+        selections["Price"] = st.sidebar.slider("Filter by Price", min_price, max_price, (min_price, max_price), key="price_filter")
+    if "Discount" in facets:
+        selections["Discount"] = st.sidebar.multiselect("Filter by Discount", facets["Discount"], key="discount_filter")
+    if "Rating" in facets:
+        selections["Rating"] = st.sidebar.multiselect("Filter by Rating", facets["Rating"], key="rating_filter")
+    # --- Spec filters (columns extracted during preprocessing) ---
+    for col, label in SPEC_FILTERS:
+        if col in facets:
+            selections[col] = st.sidebar.multiselect(f"Filter by {label}", facets[col], key=f"{col.lower()}_filter")
+    return selections
 
-    # --- Website filter ---
-    if "Website" in df.columns:
-        all_websites = []
-        for val in df["Website"].dropna():
-            if isinstance(val, list):
-                all_websites.extend(val)
-            else:
-                all_websites.append(val)
-        websites = sorted(list(set(all_websites)))
-        selected_websites = st.sidebar.multiselect("Filter by Website", websites, key="website_filter")
-        if selected_websites:
-            df = df[df["Website"].apply(lambda x: any(w in x for w in selected_websites) if isinstance(x, list) else x in selected_websites)]
-
-    # --- Price filter ---
-    if "Price" in df.columns:
-        full_prices = original_df["Price"]
-        min_price, max_price = int(full_prices.min()), int(full_prices.max())
-        selected_price = st.sidebar.slider("Filter by Price", min_price, max_price, (min_price, max_price), key="price_filter")
-        df = df[(df["Price"] >= selected_price[0]) & (df["Price"] <= selected_price[1])]
-
-    # --- Discount filter ---
-    if "Discount" in df.columns:
-        discounts = sorted(original_df["Discount"].dropna().unique().tolist())
-        selected_discounts = st.sidebar.multiselect("Filter by Discount", discounts, key="discount_filter")
-        if selected_discounts:
-            df = df[df["Discount"].isin(selected_discounts)]
-
-    # --- Rating filter ---
-    if "Rating" in df.columns:
-        ratings = sorted(original_df["Rating"].dropna().unique().tolist())
-        selected_ratings = st.sidebar.multiselect("Filter by Rating", ratings, key="rating_filter")
-        if selected_ratings:
-            df = df[df["Rating"].isin(selected_ratings)]
-
-    return df
 
+def apply_filters(df, selections):
+    """Apply the sidebar selections: a (low, high) tuple is a range, a non-empty list a set of values"""
+    mask = pd.Series(True, index=df.index)
+    for col, selected in selections.items():
+        if col not in df.columns or not selected:
+            continue
+        if isinstance(selected, tuple):
+            mask &= (df[col] >= selected[0]) & (df[col] <= selected[1])
+        else:
+            mask &= df[col].astype(object).isin(selected)
+    return df[mask.fillna(False).astype(bool)]
 
 
 # --- Step 3: Group Variants to Row ---
 def group_variants_to_row(df):
     """Group products across websites into one logical row per product"""
-    websites = df["Website"].unique()
-    grouped_rows = []
-    for _, group in df.groupby("Product"):
-        row = {"Product": group.iloc[0]["Product"]}
-        for w in websites:
-            row[f"{w.capitalize()} Price"] = None
-            row[f"{w.capitalize()} Link"] = None
-            site_data = group[group["Website"] == w]
-            if not site_data.empty:
-                row[f"{w.capitalize()} Price"] = site_data.iloc[0].get("Price", None)
-                row[f"{w.capitalize()} Link"] = site_data.iloc[0].get("Link", None)
-        grouped_rows.append(row)
-    df_grouped = pd.DataFrame(grouped_rows)
-    price_cols = [col for col in df_grouped.columns if "Price" in col]
-    return df_grouped, price_cols
+    df_grouped = pivot_by_site(df)
+    return df_grouped, site_price_columns(df_grouped)
 
 
 # --- Step 4: Highlight lowest price ---
-def highlight_lowest_price(df, price_cols):
-    def style_row(row):
-        styles = [""] * len(row)
-        prices = row[price_cols].astype(float)
-        min_price = prices.min(skipna=True)
-        for i, col in enumerate(df.columns):
-            if col in price_cols and row[col] == min_price:
-                styles[i] = "background-color: #d4edda; font-weight: bold;"
-        return styles
-    return df.style.apply(style_row, axis=1)
+LOWEST_PRICE_STYLE = "background-color: #d4edda; font-weight: bold;"
+
+
+def lowest_price_mask(df, price_cols):
+    """Boolean frame over price_cols, True where a cell holds its row's lowest price"""
+    prices = df[price_cols].to_numpy(dtype=float, na_value=np.nan)
+    row_min = np.where(np.isnan(prices), np.inf, prices).min(axis=1, initial=np.inf)
+    return pd.DataFrame(prices == row_min[:, None], index=df.index, columns=price_cols)
+
+
+def highlight_lowest_price(df, price_cols, mask=None):
+    if mask is None:
+        mask = lowest_price_mask(df, price_cols)
+    styles = pd.DataFrame("", index=df.index, columns=df.columns)
+    styles[price_cols] = np.where(mask.loc[df.index, price_cols], LOWEST_PRICE_STYLE, "")
+    return df.style.apply(lambda _: styles, axis=None)
+
+
+# --- Step 5: Sort and paginate ---
+def sort_table(df, column, ascending=True):
+    """Sort by column, missing values last"""
+    return df.sort_values(column, ascending=ascending, na_position="last", kind="stable")
+
+
+def paginate(df, page, page_size):
+    """Rows of the 1-based page"""
+    start = (page - 1) * page_size
+    return df.iloc[start:start + page_size]
+
+
+def render_results(df_grouped, price_cols):
+    """Sort server-side, then style and send only the visible page"""
+    mask = lowest_price_mask(df_grouped, price_cols)
+    sort_options = ["Lowest Price", "Product"] + price_cols
+    col_sort, col_order, col_size, col_page = st.columns(4)
+    sort_by = col_sort.selectbox("Sort by", sort_options, key="sort_by")
+    ascending = col_order.selectbox("Order", ["Ascending", "Descending"], key="sort_order") == "Ascending"
+    page_size = col_size.selectbox("Rows per page", [25, 50, 100, 200], key="page_size")
+    pages = max(1, -(-len(df_grouped) // page_size))
+    page = col_page.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key="page")
+
+    page_df = paginate(sort_table(df_grouped, sort_by, ascending), min(page, pages), page_size)
+    st.dataframe(highlight_lowest_price(page_df, price_cols, mask))
+
+
+# --- Cached stages ---
+# Keyed on the data version (a fresh token per "Run Pipeline") and the widget
+# values; the loaded frame and search engine are passed unhashed (leading _).
+@st.cache_data(max_entries=64, show_spinner=False)
+def cached_query_rows(_df, _engine, data_version, query):
+    """Positions of the rows matching query"""
+    return filter_by_query(_df, query, _engine.index if _engine else None).index.to_numpy()
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def cached_facets(_df, _engine, data_version, query):
+    return facet_summary(_df.iloc[cached_query_rows(_df, _engine, data_version, query)])
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def cached_filtered_rows(_df, _engine, data_version, query, selections):
+    df = _df.iloc[cached_query_rows(_df, _engine, data_version, query)]
+    return apply_filters(df, selections).index.to_numpy()
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def cached_grouped(_df, _engine, data_version, query, selections, top_k):
+    """Rank the filtered matches, keep the best top_k and group them"""
+    rows = cached_filtered_rows(_df, _engine, data_version, query, selections)
+    if _engine is not None:
+        df_ranked = _engine.search(query, k=top_k, match_all=True, rows=rows)
+    else:
+        df_ranked = _df.iloc[rows]
+    return group_variants_to_row(df_ranked)
+
+
+CACHED_STAGES = [cached_query_rows, cached_facets, cached_filtered_rows, cached_grouped]
+
+
+def invalidate_cached_stages():
+    """Drop every cached stage result and start a new data version"""
+    for stage in CACHED_STAGES:
+        stage.clear()
+    st.session_state.data_version = uuid.uuid4().hex
+
 
 # --- Run Pipeline Button ---
 if st.button("Run Pipeline"):
@@ -159,14 +228,19 @@ if st.button("Run Pipeline"):
         # Step 2: Preprocessing
         st.subheader("⿢ Preprocessing")
         try:
-            preprocess_all()
-            st.success("✅ Preprocessing completed.")
+            results = preprocess_all(category, query)
+            for r in results:
+                if r["error"]:
+                    st.warning(f"Could not process {r['file']}: {r['error']}")
+            st.success(f"✅ Preprocessing completed ({sum(not r['error'] for r in results)} file(s) updated).")
         except Exception as e:
             st.error(f"❌ Preprocessing failed: {e}")
         
         # Step 2: Load processed data
         df_loaded = load_processed_data(category, query)
         st.session_state.df_loaded = df_loaded  # store globally
+        st.session_state.search_engine = SearchEngine(df_loaded, "Product", "Score") if not df_loaded.empty else None
+        invalidate_cached_stages()
 
 
         # # Step 4: Cleanup (optional)
@@ -179,9 +253,17 @@ if st.button("Run Pipeline"):
 
 # --- Reactive Filtering & Display ---
 if "df_loaded" in st.session_state and not st.session_state.df_loaded.empty:
-    df_filtered = filter_by_query(st.session_state.df_loaded, query)
-    df_filtered = apply_filters(df_filtered, original_df=df_filtered)
-    df_grouped, price_cols = group_variants_to_row(df_filtered)
-    
-    st.success(f"Found {len(df_grouped)} products!")
-    st.dataframe(highlight_lowest_price(df_grouped, price_cols))
+    df_loaded = st.session_state.df_loaded
+    engine = st.session_state.get("search_engine")
+    data_version = st.session_state.get("data_version", "")
+
+    facets = cached_facets(df_loaded, engine, data_version, query)
+    selections = filter_selections(facets)
+
+    # Rank the filtered matches and keep only the best ones for display
+    top_k = st.sidebar.number_input("Top results", min_value=10, max_value=5000, value=200, step=10, key="top_k")
+    df_grouped, price_cols = cached_grouped(df_loaded, engine, data_version, query, selections, top_k)
+    matches = len(cached_filtered_rows(df_loaded, engine, data_version, query, selections))
+
+    st.success(f"Found {matches} matching listings, showing {len(df_grouped)} products!")
+    render_results(df_grouped, price_cols)
@@ -0,0 +1,101 @@
+# benchmarks/bench_cleaning.py
+"""
+Rows per second for the cleaning step of preprocess_file: the old per-cell
+`.apply(clean_*)` calls against the column kernels, with a check that both
+give identical columns. Two synthetic raw files are timed:
+
+    resampled   the bundled raw rows repeated, so values repeat heavily
+    distinct    every price and review count different (a large crawl)
+
+and a frame of object columns mixing str, int, float, bool and missing
+cells (as frames built in code hold) is checked the same way.
+
+    python -m benchmarks.bench_cleaning --rows 1000000
+"""
+import argparse
+import glob
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from utils.data_cleaning import (
+    clean_discount, clean_discount_column, clean_price, clean_price_column,
+    clean_rating, clean_rating_column, clean_reviews, clean_reviews_column,
+)
+
+COLUMNS = {
+    "Price": (clean_price, clean_price_column),
+    "Discount": (clean_discount, clean_discount_column),
+    "Ratings": (clean_rating, clean_rating_column),
+    "Reviews Count": (clean_reviews, clean_reviews_column),
+}
+
+
+def synthetic_raw_file(rows, path, raw_dir="data/raw"):
+    """Write `rows` raw rows sampled from every CSV in raw_dir to path."""
+    raw = pd.concat([pd.read_csv(f, dtype=str) for f in sorted(glob.glob(os.path.join(raw_dir, "*.csv")))],
+                    ignore_index=True)
+    raw = raw.sample(rows, replace=True, random_state=0, ignore_index=True)
+    raw.to_csv(path, index=False, encoding="utf-8-sig")
+
+
+def distinct_raw_file(rows, path):
+    """Write `rows` raw rows whose prices and review counts (nearly) never repeat to path."""
+    rng = np.random.default_rng(0)
+    prices = rng.integers(1_000, 10_000_000, rows)
+    reviews = rng.integers(1, 10_000_000, rows)
+    discounts = rng.integers(1, 90, rows)
+    ratings = rng.integers(10, 51, rows) / 10
+    pd.DataFrame({
+        "Price": [f"₹{p:,}" for p in prices],
+        "Discount": [f"-{d}%" for d in discounts],
+        "Ratings": [f"{r} out of 5 stars" for r in ratings],
+        "Reviews Count": [f"{n:,} ratings" for n in reviews],
+    }).to_csv(path, index=False, encoding="utf-8-sig")
+
+
+MIXED_VALUES = [12, 12.0, 93.0, 4.4, -3, 1e20, True, "₹38,490", "82,990", "-27%", "24% off",
+                "4.4 out of 5 stars", "488 ratings", "", "abc", None, np.nan]
+
+
+def mixed_frame(rows):
+    """Object columns of MIXED_VALUES drawn at random."""
+    rng = np.random.default_rng(0)
+    values = np.array(MIXED_VALUES, dtype=object)
+    return pd.DataFrame({col: pd.Series(values[rng.integers(0, len(values), rows)], dtype=object)
+                         for col in COLUMNS})
+
+
+def run(rows):
+    for name, make_file in (("resampled", synthetic_raw_file), ("distinct", distinct_raw_file)):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "raw.csv")
+            make_file(rows, path)
+            df = pd.read_csv(path)
+        print(f"[INFO] {name}: {len(df):,} rows")
+        time_columns(df)
+    print(f"[INFO] mixed object columns: {rows:,} rows")
+    time_columns(mixed_frame(rows))
+
+
+def time_columns(df):
+
+    for col, (scalar_fn, column_fn) in COLUMNS.items():
+        start = time.perf_counter()
+        old = df[col].apply(scalar_fn)
+        old_s = time.perf_counter() - start
+        start = time.perf_counter()
+        new = column_fn(df[col])
+        new_s = time.perf_counter() - start
+        same = "identical" if old.dtype == new.dtype and old.equals(new) else "DIFFERENT"
+        print(f"{col:>14}: apply {len(df) / old_s:12,.0f} rows/s  "
+              f"kernel {len(df) / new_s:12,.0f} rows/s  x{old_s / new_s:5.1f}  {same}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the cleaning kernels")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    run(args.rows)
@@ -0,0 +1,85 @@
+# benchmarks/bench_embeddings.py
+"""
+Compare embedding backends: encoding throughput on the bundled laptop CSVs
+and the processed tables (in any stored format), and agreement of match_products groups with a reference backend. Agreement
+is measured on same-group pairs (precision / recall against the reference).
+The disk cache is bypassed so every title is encoded.
+
+    python -m benchmarks.bench_embeddings --backends transformer char-ngram
+"""
+import argparse
+import itertools
+import time
+import pandas as pd
+from analysis.comparision import load_processed_data, match_products
+from analysis.embedding_backends import BACKENDS, TransformerBackend
+from utils.storage import PROCESSED_DIR, list_tables, read_table
+
+LAPTOP_CSVS = ["amazon_laptop_data.csv", "amazon_laptop_data_full.csv"]
+
+
+def make_backend(name):
+    cls = BACKENDS[name]
+    if issubclass(cls, TransformerBackend):
+        return cls(use_cache=False)
+    return cls()
+
+
+def load_titles(paths, processed_dir=PROCESSED_DIR):
+    """Titles of the raw CSVs in paths and of every processed table."""
+    frames = [pd.read_csv(path, usecols=["Product"]) for path in paths]
+    frames += [read_table(path, columns=["Product"]) for path in list_tables(processed_dir).values()]
+    titles = []
+    for df in frames:
+        if "Product" in df.columns:
+            titles.extend(df["Product"].dropna().astype(str).tolist())
+    return titles
+
+
+def grouped_pairs(df):
+    pairs = set()
+    for _, group in df.groupby("group_id"):
+        pairs.update(itertools.combinations(sorted(group.index), 2))
+    return pairs
+
+
+def run(names, reference, category, query, repeat):
+    titles = load_titles(LAPTOP_CSVS) * repeat
+    catalog = load_processed_data(category, query)
+    print(f"[INFO] {len(titles)} titles for throughput, {len(catalog)} listings for agreement")
+
+    results = {}
+    for name in names:
+        backend = make_backend(name)
+        try:
+            start = time.perf_counter()
+            backend.encode(titles)
+            elapsed = time.perf_counter() - start
+            results[name] = grouped_pairs(match_products(catalog.copy(), backend=backend))
+        except Exception as e:
+            print(f"[WARN] {name}: skipped ({e})")
+            continue
+        print(f"{name:>17}: {len(titles) / elapsed:10.1f} titles/s  {len(results[name])} matched pairs")
+
+    if reference not in results:
+        return
+    ref = results[reference]
+    for name, pairs in results.items():
+        if name == reference:
+            continue
+        common = len(pairs & ref)
+        precision = common / len(pairs) if pairs else 1.0
+        recall = common / len(ref) if ref else 1.0
+        print(f"{name:>17} vs {reference}: precision {precision:.3f}  recall {recall:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends")
+    parser.add_argument("--backends", nargs="+", default=sorted(BACKENDS), choices=sorted(BACKENDS))
+    parser.add_argument("--reference", default="transformer", choices=sorted(BACKENDS))
+    parser.add_argument("--category", default="electronics")
+    parser.add_argument("--query", default="macbook air ")
+    parser.add_argument("--repeat", type=int, default=5, help="Times to repeat the title list")
+    args = parser.parse_args()
+
+    run(args.backends, args.reference, args.category, args.query, args.repeat)
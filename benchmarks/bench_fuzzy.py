@@ -0,0 +1,59 @@
+# benchmarks/bench_fuzzy.py
+"""
+Pairs scored per second by the fuzzy stage of match_products: the old
+one-pair-at-a-time fuzz.token_sort_ratio loop, block-wise process.cdist
+tiles, and a single process.cpdist batch over the candidate pairs.
+
+    python -m benchmarks.bench_fuzzy --copies 50
+"""
+import argparse
+import time
+from rapidfuzz import fuzz
+from analysis.comparision import (
+    block_fuzzy_scores, candidate_pairs, load_processed_data, pair_fuzzy_scores,
+)
+from benchmarks.bench_matching import synthetic_catalog
+
+
+def loop_scores(titles, candidates, cutoff):
+    scores = {}
+    for i, js in candidates.items():
+        for j in js:
+            ratio = fuzz.token_sort_ratio(titles[i], titles[j])
+            if ratio >= cutoff:
+                scores[(i, j)] = ratio
+    return scores
+
+
+def run(category, query, copies, cutoff):
+    df = synthetic_catalog(load_processed_data(category, query), copies)
+    candidates, blocks = candidate_pairs(df, return_blocks=True)
+    titles = df['Product'].astype(str).tolist()
+    platforms = df['platform'].tolist()
+    n_pairs = sum(len(js) for js in candidates.values())
+    print(f"[INFO] {len(df)} listings, {n_pairs:,} candidate pairs")
+
+    runs = [
+        ("loop", lambda: loop_scores(titles, candidates, cutoff)),
+        ("cdist", lambda: block_fuzzy_scores(titles, platforms, blocks, cutoff)),
+        ("cpdist", lambda: pair_fuzzy_scores(titles, candidates, cutoff)),
+    ]
+    reference = None
+    for name, fn in runs:
+        start = time.perf_counter()
+        scores = fn()
+        elapsed = time.perf_counter() - start
+        reference = reference if reference is not None else set(scores)
+        same = "same pairs" if set(scores) == reference else "DIFFERENT pairs"
+        print(f"{name:>7}: {n_pairs / elapsed:14,.0f} pairs/s  {elapsed:8.3f}s  {same}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark batched fuzzy scoring")
+    parser.add_argument("--category", default="electronics")
+    parser.add_argument("--query", default="macbook air ")
+    parser.add_argument("--copies", type=int, default=20, help="Times to replicate the bundled data")
+    parser.add_argument("--cutoff", type=float, default=85)
+    args = parser.parse_args()
+
+    run(args.category, args.query, args.copies, args.cutoff)
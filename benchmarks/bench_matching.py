@@ -0,0 +1,138 @@
+# benchmarks/bench_matching.py
+"""
+Compare candidate generation of the old all-pairs loop in match_products
+with the blocking stage (pair count and wall time). The old loop is kept
+here as it was before blocking, regex same_model filter included, and
+counts the pairs it sent to fuzzy scoring. Fuzzy scoring is run on every
+candidate pair; the embedding fallback is left out so the benchmark needs
+no model weights.
+
+    python -m benchmarks.bench_matching --copies 50
+"""
+import argparse
+import re
+import time
+import pandas as pd
+from rapidfuzz import fuzz
+from analysis.comparision import load_processed_data, candidate_pairs
+
+
+def copy_tag(k):
+    """A letters-only word for copy k ("edaaa", "edaab", ...), so it never reads as a model code or spec."""
+    letters = ""
+    for _ in range(3):
+        k, r = divmod(k, 26)
+        letters = chr(ord("a") + r) + letters
+    return "ed" + letters
+
+
+def synthetic_catalog(df, copies):
+    """
+    Repeat the bundled listings, each copy with a tag word after the first
+    word of its titles. Specs and model codes are left as they are, so
+    copies of a listing block together like real re-listings would.
+    """
+    frames = []
+    for k in range(copies):
+        part = df.copy()
+        words = part['Product'].astype(str).str.split(" ", n=1)
+        part['Product'] = words.str[0] + f" {copy_tag(k)} " + words.str[1].fillna("")
+        frames.append(part)
+    return pd.concat(frames, ignore_index=True)
+
+
+def legacy_screen_size(title):
+    match = re.search(r'(\d{2,2}(\.\d)?)\s*(inch|")', title.lower())
+    if match:
+        return match.group(1)
+    match2 = re.search(r'\b(\d{2})\b', title)
+    return match2.group(1) if match2 else None
+
+
+def legacy_model_code(title):
+    match = re.search(r'([a-zA-Z0-9\-]{5,})', title)
+    return match.group(1) if match else None
+
+
+def legacy_same_model(row1, row2):
+    """same_model as it was before blocking: regexes re-run on every pair."""
+    size1 = legacy_screen_size(row1['Product'])
+    size2 = legacy_screen_size(row2['Product'])
+    model1 = legacy_model_code(row1['Product'])
+    model2 = legacy_model_code(row2['Product'])
+
+    if model1 and model2:
+        return model1.lower() == model2.lower()
+    elif size1 and size2:
+        return size1 == size2
+    return False
+
+
+def all_pairs(df, text_threshold=85):
+    """The old match_products loop without the embedding fallback; returns the pairs fuzzy-scored."""
+    df = df.reset_index(drop=True)
+    df['group_id'] = None
+    df['matched'] = False
+    group_counter = 0
+    pairs = 0
+
+    for i, row in df.iterrows():
+        if df.at[i, 'group_id'] is not None:
+            continue
+
+        df.at[i, 'group_id'] = group_counter
+        df.at[i, 'matched'] = False
+        current_platform = row['platform']
+
+        for j, other_row in df.iloc[i+1:].iterrows():
+            if df.at[j, 'group_id'] is not None:
+                continue
+            if other_row['platform'] == current_platform:
+                continue
+
+            if legacy_same_model(row, other_row):
+                pairs += 1
+                ratio = fuzz.token_sort_ratio(row['Product'], other_row['Product'])
+                if ratio >= text_threshold:
+                    df.at[j, 'group_id'] = group_counter
+                    df.at[j, 'matched'] = True
+                    df.at[i, 'matched'] = True
+
+        group_counter += 1
+
+    return pairs
+
+
+def blocked_pairs(df):
+    titles = df['Product'].astype(str).tolist()
+    pairs = 0
+    for i, js in candidate_pairs(df).items():
+        for j in js:
+            pairs += 1
+            fuzz.token_sort_ratio(titles[i], titles[j])
+    return pairs
+
+
+def run(category, query, copies, skip_legacy):
+    df = synthetic_catalog(load_processed_data(category, query), copies)
+    print(f"[INFO] {len(df)} listings ({copies} copies)")
+
+    runs = [("blocked", blocked_pairs)]
+    if not skip_legacy:
+        runs.insert(0, ("all-pairs", all_pairs))
+    for name, fn in runs:
+        start = time.perf_counter()
+        pairs = fn(df)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>10}: {pairs:>12,} pairs  {elapsed:8.3f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark blocking in match_products")
+    parser.add_argument("--category", default="electronics")
+    parser.add_argument("--query", default="macbook air ")
+    parser.add_argument("--copies", type=int, default=20, help="Times to replicate the bundled data")
+    parser.add_argument("--skip-legacy", action="store_true", help="Only time the blocked path")
+    args = parser.parse_args()
+
+    run(args.category, args.query, args.copies, args.skip_legacy)
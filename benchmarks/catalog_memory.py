@@ -0,0 +1,36 @@
+# benchmarks/catalog_memory.py
+"""
+Memory of each processed table as the loaders used to hold it (pd.read_csv
+with object strings) and after utils.dtypes.optimize_dtypes.
+
+    python -m benchmarks.catalog_memory
+"""
+import argparse
+import os
+from utils.dtypes import memory_usage, optimize_dtypes
+from utils.storage import list_tables, read_table
+
+
+def run(processed_dir):
+    total_before = total_after = 0
+    for stem, path in list_tables(processed_dir).items():
+        site = os.path.basename(stem).split("_")[0]
+        before = read_table(path).assign(Website=site)
+        before = before.astype({c: object for c in before.select_dtypes(["object", "string"]).columns})
+        before = before.astype({c: "float64" for c in before.select_dtypes("number").columns})
+        after = optimize_dtypes(read_table(path).assign(Website=site))
+        b, a = memory_usage(before), memory_usage(after)
+        total_before += b
+        total_after += a
+        print(f"{os.path.basename(path):>45}: {b / 1024:8.1f} KB → {a / 1024:8.1f} KB  ({a / b:.0%})")
+    if total_before:
+        print(f"{'total':>45}: {total_before / 1024:8.1f} KB → {total_after / 1024:8.1f} KB  "
+              f"({total_after / total_before:.0%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report catalog memory before/after dtype optimization")
+    parser.add_argument("--processed-dir", default="data/processed")
+    args = parser.parse_args()
+
+    run(args.processed_dir)
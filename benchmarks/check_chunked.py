@@ -0,0 +1,45 @@
+# benchmarks/check_chunked.py
+"""
+Check that streaming preprocess_file (chunksize=k) writes the same table as
+the whole-file path for every raw CSV. Near-duplicate collapsing is turned
+off, as the chunked path only collapses within each chunk.
+
+    python -m benchmarks.check_chunked --chunksize 7
+"""
+import argparse
+import glob
+import os
+import sys
+import tempfile
+from utils.data_cleaning import preprocess_file
+from utils.storage import DEFAULT_FORMAT, read_table, table_path
+
+
+def differing_columns(whole, chunked):
+    """Columns whose values differ between the two frames (all of them if the shapes differ)."""
+    if whole.shape != chunked.shape or list(whole.columns) != list(chunked.columns):
+        return list(whole.columns)
+    whole, chunked = whole.reset_index(drop=True), chunked.reset_index(drop=True)
+    return [col for col in whole.columns if not whole[col].equals(chunked[col])]
+
+
+def run(chunksize, raw_dir="data/raw"):
+    failed = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for input_file in sorted(glob.glob(os.path.join(raw_dir, "*.csv"))):
+            whole_file = table_path(os.path.join(tmp, "whole"), DEFAULT_FORMAT)
+            chunked_file = table_path(os.path.join(tmp, "chunked"), DEFAULT_FORMAT)
+            preprocess_file(input_file, whole_file, near_dup_threshold=None)
+            preprocess_file(input_file, chunked_file, chunksize, near_dup_threshold=None)
+            columns = differing_columns(read_table(whole_file), read_table(chunked_file))
+            failed += bool(columns)
+            print(f"{os.path.basename(input_file)}: {'DIFFERENT ' + ', '.join(columns) if columns else 'identical'}")
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare chunked and whole-file preprocessing")
+    parser.add_argument("--chunksize", type=int, default=7)
+    args = parser.parse_args()
+
+    sys.exit(1 if run(args.chunksize) else 0)
@@ -0,0 +1,53 @@
+# benchmarks/check_incremental.py
+"""
+Check that match_incremental agrees with a full match_products run after
+listings are retired: the bundled catalog is matched incrementally (into a
+temporary state directory), the listings of the largest group on its
+least represented platform are dropped, and the incremental refresh is
+compared with match_products on the remaining frame, group by group.
+
+    python -m benchmarks.check_incremental --backend char-ngram
+"""
+import argparse
+import sys
+import tempfile
+from analysis import match_state
+from analysis.comparision import BACKENDS, load_processed_data, match_products
+
+
+def matched_groups(df):
+    """The matched groups of df as sets of row labels."""
+    return {frozenset(group.index) for _, group in df[df["matched"]].groupby("group_id")}
+
+
+def run(category, query, backend):
+    df = load_processed_data(category, query)
+    with tempfile.TemporaryDirectory() as tmp:
+        match_state.STATE_DIR = tmp
+        first = match_state.match_incremental(df.copy(), category, query, backend=backend)
+        sizes = first[first["matched"]].groupby("group_id").size()
+        if sizes.empty:
+            print("[WARN] No matched groups to retire listings from.")
+            return True
+        group = first[first["group_id"] == sizes.idxmax()]
+        retired = group.index[group["platform"] == group["platform"].value_counts().idxmin()]
+        rest = df.drop(index=retired).reset_index(drop=True)
+
+        incremental = match_state.match_incremental(rest.copy(), category, query, backend=backend)
+    full = match_products(rest.copy(), backend=backend)
+
+    same = matched_groups(incremental) == matched_groups(full)
+    print(f"[INFO] Retired {len(retired)} listing(s) of group {sizes.idxmax()}: "
+          f"incremental {incremental['matched'].sum()} matched, full {full['matched'].sum()} matched, "
+          f"{'identical' if same else 'DIFFERENT'} groups")
+    return same
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare incremental and full matching after retiring listings")
+    parser.add_argument("--category", default="electronics")
+    parser.add_argument("--query", default="macbook air ")
+    parser.add_argument("--backend", default="char-ngram", choices=sorted(BACKENDS))
+    args = parser.parse_args()
+
+    sys.exit(0 if run(args.category, args.query, args.backend) else 1)
@@ -0,0 +1,62 @@
+# benchmarks/import_time.py
+"""
+Per-module import-time report, to catch startup regressions.
+
+Each entry point is imported in a fresh interpreter with `-X importtime`;
+the report lists total import time and the slowest modules by cumulative
+time.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time analysis.comparision --top 20
+"""
+import argparse
+import subprocess
+import sys
+
+ENTRY_POINTS = [
+    "analysis.comparision",
+    "jobs.scrape_by_category",
+    "utils.data_cleaning",
+    "product_matching.query_handler",
+    "main",
+]
+
+
+def import_times(module):
+    """Return [(cumulative_us, self_us, name)] for importing `module`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    return rows
+
+
+def report(modules, top):
+    for module in modules:
+        try:
+            rows = import_times(module)
+        except RuntimeError as e:
+            print(f"[WARN] {module}: import failed ({e})")
+            continue
+        total = next((cum for cum, _, name in rows if name == module), 0)
+        print(f"\n{module}: {total / 1000:.1f} ms")
+        for cum, own, name in sorted(rows, reverse=True)[:top]:
+            print(f"  {cum / 1000:9.1f} ms  {own / 1000:8.1f} ms self  {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report per-module import times")
+    parser.add_argument("modules", nargs="*", default=ENTRY_POINTS, help="Modules to import")
+    parser.add_argument("--top", type=int, default=10, help="Slowest modules to list per entry point")
+    args = parser.parse_args()
+
+    report(args.modules, args.top)
@@ -1,18 +1,19 @@
 # main.py
 
-from product_matching.query_handler import load_all_processed_data
+from product_matching.batch_query import cached_catalog, run_batch
 from product_matching.grouping import group_variants
 from product_matching.presenter import show_grouped_results_table
 
-def run_query(category: str, query: str):
+def run_query(category: str, query: str, k: int = 20):
     """
-    Run a product matching query by loading all processed files,
-    filtering by query, grouping variants, and showing results in table format.
+    Run a product matching query by loading all processed files, ranking
+    the k best listings of the category by BM25, grouping variants, and
+    showing results in table format.
     """
     print(f"\n🔍 Running query: '{query}' in category: '{category}'")
 
-    # Step 1: Load all processed CSVs and filter by query
-    df = load_all_processed_data(query)
+    # Step 1: Rank the top k for the query (tables and index are loaded once per process)
+    df = cached_catalog().search(query, k, filters={"category": category} if category else None)
 
     if df.empty:
         print("⚠️ No products found for this query.")
@@ -22,9 +23,21 @@ def run_query(category: str, query: str):
     grouped = group_variants(df, query)
 
     # Step 3: Show table-style output
-    show_grouped_results_table(grouped)
+    show_grouped_results_table(grouped, query)
 
 
 if __name__ == "__main__":
-    # Example query: change as needed
-    run_query("electronics", "macbook air")
+    import argparse
+    parser = argparse.ArgumentParser(description="Query the processed catalog")
+    parser.add_argument("--category", default="electronics")
+    parser.add_argument("--query", default="macbook air")
+    parser.add_argument("-k", type=int, default=20, help="Number of ranked results")
+    parser.add_argument("--batch", help="CSV/JSONL of category,query pairs to run in one pass")
+    parser.add_argument("--output", default="data/matched/batch_results.jsonl",
+                        help="Batch results file (.jsonl, .parquet, .feather or .csv)")
+    args = parser.parse_args()
+
+    if args.batch:
+        run_batch(args.batch, args.output)
+    else:
+        run_query(args.category, args.query, args.k)
@@ -0,0 +1,196 @@
+# product_matching/batch_query.py
+"""
+Batch queries against the whole processed catalog.
+
+The nightly repricing job runs thousands of (category, query) pairs.
+Catalog loads every processed table once, drops same-site duplicates the
+way load_all_processed_data does, and builds a single token index over
+all titles; cached_catalog keeps one per process until a table changes.
+run_batch resolves the queries in one pass: each distinct query token is
+looked up once for the whole batch (TokenIndex.lookup_many), and a query's
+rows are intersected with its category's rows. Matches are written as they
+are found, one row per (query, listing), to JSONL or to any utils.storage
+table format.
+
+    python main.py --batch queries.csv --output results.jsonl
+
+The queries file is a CSV or JSONL with "category" and "query" columns.
+"""
+import os
+import time
+import numpy as np
+import pandas as pd
+from config.category_mapping import CATEGORY_WEBSITES
+from product_matching.search import SearchEngine
+from utils.catalog_cache import read_cached
+from utils.storage import PROCESSED_DIR, TableWriter, list_tables
+from utils.token_index import TokenIndex
+
+RESULT_COLUMNS = {
+    "query_id": "int64",
+    "category": "str",
+    "query": "str",
+    "website": "str",
+    "product": "str",
+    "price": "Int64",
+    "discount": "Int64",
+    "ratings": "float64",
+    "link": "str",
+    "product_id": "str",
+}
+
+# Result rows buffered before each write
+WRITE_BATCH = 50_000
+
+# processed_dir → (table stamps, Catalog), see cached_catalog
+_CATALOGS = {}
+
+
+def table_category(stem):
+    """(site, category) of a processed table stem "{site}_{category}_{query}"."""
+    site, _, rest = os.path.basename(stem).partition("_")
+    for category in sorted(CATEGORY_WEBSITES, key=len, reverse=True):
+        if rest.startswith(category + "_"):
+            return site.lower(), category
+    return site.lower(), rest.partition("_")[0]
+
+
+class Catalog:
+    """Every processed table in one frame, with one token index over its titles (and BM25 search)."""
+
+    def __init__(self, processed_dir=PROCESSED_DIR):
+        frames = []
+        for stem, path in list_tables(processed_dir).items():
+            df = read_cached(path)
+            df.columns = [col.strip().lower().replace(" ", "_") for col in df.columns]
+            if "product" not in df.columns:
+                print(f"⚠️ 'product' column missing in {path}, skipping.")
+                continue
+            site, category = table_category(stem)
+            frames.append(df.assign(website=site, category=category))
+
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["product", "website", "category"])
+        # Same product ID (or, without one, same title) on the same site
+        key = df["product_id"].fillna(df["product"]) if "product_id" in df.columns else df["product"]
+        self.df = df[~df.assign(_key=key).duplicated(subset=["_key", "website"])].reset_index(drop=True)
+        self.index = TokenIndex(self.df["product"])
+
+        codes, categories = pd.factorize(self.df["category"])
+        self._category_codes = codes
+        self._categories = {category: i for i, category in enumerate(categories)}
+        self._engine = None
+
+    def __len__(self):
+        return len(self.df)
+
+    def search(self, query, k=20, filters=None):
+        """
+        Top-k listings for query by BM25 (see product_matching.search) among
+        those holding every query token; when none does, any shared token counts.
+        """
+        if self._engine is None:
+            self._engine = SearchEngine(self.df, "product", index=self.index)
+        result = self._engine.search(query, k, filters, match_all=True)
+        if result.empty:
+            result = self._engine.search(query, k, filters)
+        return result
+
+    def resolve(self, pairs):
+        """Row ids for each (category, query) pair, in order; an unknown category matches nothing."""
+        categories = [category for category, _ in pairs]
+        for category, rows in zip(categories, self.index.lookup_many((q for _, q in pairs), prefix=True)):
+            code = self._categories.get(category, -1) if category else None
+            if code is not None:
+                rows = rows[self._category_codes[rows] == code]
+            yield rows
+
+    def results(self, rows, query_ids, pairs):
+        """Result frame (RESULT_COLUMNS) for matched rows, query_ids[i] being the pair rows[i] answers."""
+        matched = self.df.iloc[rows]
+        out = pd.DataFrame({col: matched[col].to_numpy() if col in matched.columns else None
+                            for col in RESULT_COLUMNS})
+        queries = np.array([q for _, q in pairs], dtype=object)
+        out["query_id"] = query_ids
+        out["query"] = queries[query_ids]
+        return out.astype(RESULT_COLUMNS)
+
+
+def cached_catalog(processed_dir=PROCESSED_DIR):
+    """Catalog of processed_dir, built once per process and again only when its tables change."""
+    stamps = {}
+    for path in list_tables(processed_dir).values():
+        stat = os.stat(path)
+        stamps[path] = (stat.st_size, stat.st_mtime_ns)
+    key = os.path.abspath(processed_dir)
+    entry = _CATALOGS.get(key)
+    if entry is None or entry[0] != stamps:
+        entry = _CATALOGS[key] = (stamps, Catalog(processed_dir))
+    return entry[1]
+
+
+def read_queries(path):
+    """[(category, query)] from a CSV or JSONL file with category and query columns."""
+    df = pd.read_json(path, lines=True, dtype=False) if path.endswith((".jsonl", ".json")) \
+        else pd.read_csv(path, dtype=str, keep_default_na=False)
+    if "query" not in df.columns:
+        raise ValueError(f"{path} has no 'query' column")
+    categories = df["category"] if "category" in df.columns else pd.Series("", index=df.index)
+    return list(zip(categories.fillna("").astype(str).str.strip().str.lower(),
+                    df["query"].fillna("").astype(str)))
+
+
+class _JsonlWriter:
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+
+    def __enter__(self):
+        self._file = open(self.tmp_path, "w", encoding="utf-8")
+        return self
+
+    def write(self, df):
+        df.to_json(self._file, orient="records", lines=True, force_ascii=False)
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        if exc_type is not None:
+            os.remove(self.tmp_path)
+            return False
+        os.replace(self.tmp_path, self.path)
+        return False
+
+
+def run_batch(queries_file, output_file, processed_dir=PROCESSED_DIR, catalog=None):
+    """
+    Run every (category, query) pair of queries_file against the catalog and
+    stream the matches to output_file (.jsonl, or a utils.storage format).
+    Returns {"queries", "results", "load_seconds", "seconds", "qps"}.
+    """
+    start = time.perf_counter()
+    if catalog is None:
+        catalog = Catalog(processed_dir)
+    pairs = read_queries(queries_file)
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    writer = _JsonlWriter(output_file) if output_file.endswith(".jsonl") else TableWriter(output_file)
+    total, buffered, pending, pending_ids = 0, 0, [], []
+    with writer:
+        for query_id, rows in enumerate(catalog.resolve(pairs)):
+            pending.append(rows)
+            pending_ids.append(np.full(len(rows), query_id))
+            total += len(rows)
+            buffered += len(rows)
+            if buffered >= WRITE_BATCH or query_id == len(pairs) - 1:
+                writer.write(catalog.results(np.concatenate(pending), np.concatenate(pending_ids), pairs))
+                buffered, pending, pending_ids = 0, [], []
+        if not pairs:
+            writer.write(catalog.results(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), pairs))
+    seconds = time.perf_counter() - start
+
+    qps = len(pairs) / seconds if seconds else float("inf")
+    print(f"[INFO] {len(pairs)} queries over {len(catalog)} listings: {total} results in {seconds:.2f}s "
+          f"({qps:,.0f} queries/s; catalog loaded in {load_seconds:.2f}s) → {output_file}")
+    return {"queries": len(pairs), "results": total, "load_seconds": load_seconds,
+            "seconds": seconds, "qps": qps}
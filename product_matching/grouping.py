@@ -1,16 +1,71 @@
 # product_matching/grouping.py
+"""
+Cross-site grouping: one row per product, one price and link column per site.
+
+    Product | Amazon Price | Amazon Link | Flipkart Price | Flipkart Link | Lowest Price | Best Site
+
+pivot_by_site builds the table in one scatter into a (product × site)
+array, so its cost is linear in the listings. Products keep the order
+they first appear in (a ranked input stays ranked), sites likewise, and
+the first listing of a product on a site fills its cells. Column names
+are matched case-insensitively, so both the dashboard's "Product" frames
+and the catalog's "product" frames work. app.group_variants_to_row,
+group_variants and presenter.show_grouped_results_table all use it.
+"""
+import numpy as np
 import pandas as pd
-def group_variants(df, query):
-    grouped_list = []
-    for idx, row in df.iterrows():
-        grouped_list.append({
-            "title": row["Product"],   # ✅ capitalized
-            "website": row["Website"], # ✅ capitalized
-            "price": row.get("Price", None),
-            "discount": row.get("Discount", None),
-            "rating": row.get("Rating", None),
-            "no_of_review": row.get("No_of_review", None),
-            "category": row.get("Category", None),
-            "link": row.get("Link", None)
-        })
-    return pd.DataFrame(grouped_list)
+
+
+def _column(df, name):
+    for col in df.columns:
+        if str(col).strip().lower().replace(" ", "_") == name:
+            return col
+    return None
+
+
+def site_price_columns(table):
+    """The "<Site> Price" columns of a pivot_by_site table."""
+    return [col for col in table.columns if col.endswith(" Price") and col != "Lowest Price"]
+
+
+def pivot_by_site(df, product="product", website="website", price="price", link="link"):
+    """Product × website price/link table of df with Lowest Price and Best Site columns."""
+    product_col, website_col = _column(df, product), _column(df, website)
+    price_col, link_col = _column(df, price), _column(df, link)
+
+    products, product_names = pd.factorize(df[product_col])
+    sites, site_names = pd.factorize(df[website_col].astype(object))
+    site_names = [str(site) for site in site_names]
+
+    # First listing of each (product, site) cell
+    keep = (products >= 0) & (sites >= 0)
+    keep &= ~pd.Series(products.astype(np.int64) * len(site_names) + sites).duplicated().to_numpy()
+    rows, cols = products[keep], sites[keep]
+
+    shape = (len(product_names), len(site_names))
+    prices = np.full(shape, np.nan)
+    if price_col is not None:
+        prices[rows, cols] = pd.to_numeric(df[price_col], errors="coerce").to_numpy(dtype=float, na_value=np.nan)[keep]
+    links = np.full(shape, None, dtype=object)
+    if link_col is not None:
+        links[rows, cols] = df[link_col].astype(object).to_numpy()[keep]
+
+    # Lowest price and the site offering it, column-wise over the price array
+    masked = np.where(np.isnan(prices), np.inf, prices)
+    best = masked.argmin(axis=1) if len(site_names) else np.zeros(len(product_names), dtype=np.int64)
+    lowest = masked[np.arange(len(product_names)), best] if len(site_names) else np.full(len(product_names), np.inf)
+    found = np.isfinite(lowest)
+
+    price_dtype = "Int64" if price_col is not None and pd.api.types.is_integer_dtype(df[price_col]) else "float64"
+    table = {"Product": np.asarray(product_names, dtype=object)}
+    for j, site in enumerate(site_names):
+        table[f"{site.capitalize()} Price"] = pd.array(prices[:, j], dtype=price_dtype)
+        table[f"{site.capitalize()} Link"] = links[:, j]
+    table["Lowest Price"] = pd.array(np.where(found, lowest, np.nan), dtype=price_dtype)
+    table["Best Site"] = np.where(found, np.array(site_names + [""], dtype=object)[best], None)
+    return pd.DataFrame(table)
+
+
+def group_variants(df, query=None):
+    """Group listings across websites into one row per product (see pivot_by_site)."""
+    return pivot_by_site(df)
@@ -1,25 +1,19 @@
 # product_matching/presenter.py
 import pandas as pd
+from product_matching.grouping import site_price_columns
 
-def show_grouped_results_table(grouped_results: dict):
+def show_grouped_results_table(grouped_results: pd.DataFrame, title: str = None):
     """
     Display grouped results in a table format:
     Each row = product variant, columns = websites with prices
+    (a product_matching.grouping.pivot_by_site table)
     """
-    for group_name, items in grouped_results.items():
-        print(f"\n🔹 {group_name}\n")
+    if title:
+        print(f"\n🔹 {title}\n")
 
-        # Create a dataframe with product titles as rows and websites as columns
-        data = {}
-        for item in items:
-            title = item['title']
-            website = item['website']
-            price = item['price']
-            
-            if title not in data:
-                data[title] = {}
-            data[title][website] = price
-
-        df_table = pd.DataFrame.from_dict(data, orient='index').fillna("-")
-        df_table.index.name = "Product Variant"
-        print(df_table)
+    columns = site_price_columns(grouped_results) + ["Lowest Price", "Best Site"]
+    df_table = grouped_results.set_index("Product")[columns]
+    df_table.columns = [col[:-len(" Price")] if col in columns[:-2] else col for col in columns]
+    df_table = df_table.astype(object).where(df_table.notna(), "-")
+    df_table.index.name = "Product Variant"
+    print(df_table)
@@ -1,36 +1,48 @@
 import os
 import pandas as pd
+from utils.catalog_cache import CATALOG_CACHE, read_cached
+from utils.dtypes import optimize_dtypes
+from utils.storage import list_tables
+from utils.token_index import TokenIndex
 
-def load_all_processed_data(query: str, processed_dir="data/processed"):
+def load_all_processed_data(query: str, processed_dir="data/processed", websites=None, price_range=None):
     all_data = []
 
-    for file in os.listdir(processed_dir):
-        if file.endswith(".csv"):
-            filepath = os.path.join(processed_dir, file)
-            print(f"📄 Loading file: {filepath}")  # ← Added line to show which CSV is loading
+    for stem, filepath in list_tables(processed_dir).items():
+        # Extract website from filename
+        site_name = os.path.basename(stem).split("_")[0].lower()
+        if websites is None or site_name in websites:
+            print(f"📄 Loading file: {filepath}")  # ← Added line to show which file is loading
 
-            df = pd.read_csv(filepath)
+            # Table and its token index come from memory after the first load
+            df = read_cached(filepath)
 
             # standardize columns
             df.columns = [col.strip().lower().replace(" ", "_") for col in df.columns]
 
             if 'product' not in df.columns:
-                print(f"⚠️ 'product' column missing in {file}, skipping.")
+                print(f"⚠️ 'product' column missing in {filepath}, skipping.")
                 continue
 
-            # Broad query filtering
-            mask = df['product'].str.contains(query, case=False, na=False)
-            filtered = df[mask].copy()
-
-            # Extract website from filename
-            site_name = os.path.basename(file).split("_")[0].lower()
+            # Broad query filtering: every query word as a token prefix
+            index = CATALOG_CACHE.get(filepath, "token_index", lambda path: TokenIndex(df['product']))
+            filtered = df.iloc[index.lookup(query, prefix=True)].copy()
+            if price_range and 'price' in filtered.columns:
+                low, high = price_range
+                if low is not None:
+                    filtered = filtered[(filtered['price'] >= low).fillna(False)]
+                if high is not None:
+                    filtered = filtered[(filtered['price'] <= high).fillna(False)]
             filtered["website"] = site_name
 
             all_data.append(filtered)
 
     if all_data:
         combined_df = pd.concat(all_data, ignore_index=True)
-        combined_df.drop_duplicates(subset=['product', 'website'], inplace=True)
-        return combined_df
+        # Same product ID (or, without one, same title) on the same site
+        key = combined_df['product_id'].fillna(combined_df['product']) if 'product_id' in combined_df.columns \
+            else combined_df['product']
+        combined_df = combined_df[~combined_df.assign(_key=key).duplicated(subset=['_key', 'website'])]
+        return optimize_dtypes(combined_df)
 
     return pd.DataFrame()
@@ -0,0 +1,111 @@
+# product_matching/search.py
+"""
+Relevance-ranked search over product titles.
+
+SearchEngine scores titles with BM25 against a sparse title × token
+matrix and returns only the best k rows, ranked:
+
+    engine = SearchEngine(df, "Product")
+    engine.search("macbook air m2", k=20, filters={"Website": ["amazon"], "Price": (50000, None)})
+
+Weights are precomputed per (title, token) at build time and stored column
+by column (CSC), so a query touches only the titles containing its tokens.
+Query tokens are read as in utils.token_index: synonyms count as the same
+token and a trailing '*' matches every token with that prefix (the best
+matching variant scores). filters maps a column to a value, a list of
+values, or a (low, high) range with either bound None. With match_all only
+titles holding every query token are ranked; otherwise any shared token
+counts. The top k come from np.argpartition over the candidates, so only
+k rows are ever sorted or copied.
+"""
+from collections import Counter
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from utils.token_index import TokenIndex, tokenize
+
+# BM25 term-frequency saturation and length normalization
+K1 = 1.5
+B = 0.75
+
+
+class SearchEngine:
+    """BM25 top-k search over df[text_column]; results are rows of df with a score column."""
+
+    def __init__(self, df, text_column="product", score_column="score", index=None):
+        self.df = df
+        self.score_column = score_column
+        self.index = index if index is not None else TokenIndex(df[text_column])
+        ids = self.index.ids
+
+        # Term counts of each distinct title, then one matrix row per listing
+        codes, uniques = pd.factorize(pd.Series(df[text_column], dtype=object))
+        counts = [Counter(tokenize(title)) for title in uniques]
+        lengths = np.fromiter(map(len, counts), dtype=np.int64, count=len(counts))
+        cols = np.fromiter((ids[t] for c in counts for t in c), dtype=np.int64, count=int(lengths.sum()))
+        tf = np.fromiter((n for c in counts for n in c.values()), dtype=np.float32, count=int(lengths.sum()))
+        indptr = np.concatenate([[0], np.cumsum(lengths), [lengths.sum()]])
+        titles = sparse.csr_matrix((tf, cols, indptr), shape=(len(uniques) + 1, len(self.index.vocabulary)))
+        tf = titles[np.where(codes >= 0, codes, len(uniques))].tocsc()    # missing titles: empty row
+
+        # BM25 weight of each (listing, token)
+        n = tf.shape[0]
+        doc_len = np.asarray(tf.sum(axis=1)).ravel()
+        avg_len = doc_len.mean() if n and doc_len.mean() else 1.0
+        df_t = np.diff(tf.indptr)
+        idf = np.log1p((n - df_t + 0.5) / (df_t + 0.5)).astype(np.float32)
+        rows = tf.indices
+        norm = K1 * (1 - B + B * doc_len[rows] / avg_len)
+        weights = tf.data * (K1 + 1) / (tf.data + norm) * np.repeat(idf, df_t)
+        self.weights = sparse.csc_matrix((weights.astype(np.float32), rows, tf.indptr), shape=tf.shape)
+
+    def _filter_mask(self, filters, rows):
+        """Mask over rows (positions) of those meeting every filter."""
+        mask = np.ones(len(rows), dtype=bool)
+        for col, condition in (filters or {}).items():
+            if col not in self.df.columns:
+                continue
+            values = self.df[col].iloc[rows]
+            if isinstance(condition, tuple):
+                low, high = condition
+                if low is not None:
+                    mask &= (values >= low).fillna(False).to_numpy(dtype=bool)
+                if high is not None:
+                    mask &= (values <= high).fillna(False).to_numpy(dtype=bool)
+            elif isinstance(condition, (list, set, frozenset, np.ndarray, pd.Index, pd.Series)):
+                mask &= values.isin(list(condition)).to_numpy(dtype=bool)
+            else:
+                mask &= (values == condition).fillna(False).to_numpy(dtype=bool)
+        return mask
+
+    def scores(self, query, prefix=False):
+        """Dense BM25 score per row (0 where no query token occurs)."""
+        scores = np.zeros(len(self.df), dtype=np.float32)
+        indptr, indices, data = self.weights.indptr, self.weights.indices, self.weights.data
+        for token, is_prefix in self.index.terms(query, prefix):
+            term = np.zeros(len(self.df), dtype=np.float32)
+            for i in self.index.term_ids(token, is_prefix):
+                rows = indices[indptr[i]:indptr[i + 1]]
+                term[rows] = np.maximum(term[rows], data[indptr[i]:indptr[i + 1]])
+            scores += term
+        return scores
+
+    def search(self, query, k=20, filters=None, match_all=False, prefix=False, rows=None):
+        """
+        The k best rows of df for query (all matches for k=None), best first,
+        with their score. rows optionally restricts the search to these positions.
+        """
+        scores = self.scores(query, prefix)
+        candidates = self.index.lookup(query, prefix) if match_all else np.flatnonzero(scores > 0)
+        if rows is not None:
+            candidates = np.intersect1d(candidates, rows)
+        if filters:
+            candidates = candidates[self._filter_mask(filters, candidates)]
+
+        if k is not None and len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]] if k > 0 \
+                else candidates[:0]
+        top = candidates[np.lexsort((candidates, -scores[candidates]))]
+        result = self.df.iloc[top].copy()
+        result[self.score_column] = scores[top]
+        return result
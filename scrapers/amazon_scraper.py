@@ -1,13 +1,16 @@
 import time
 import pandas as pd
 import os
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from utils.lazy import lazy_import, lazy_attr
+
+# Selenium is imported on first use
+webdriver = lazy_import("selenium.webdriver")
+Service = lazy_attr("selenium.webdriver.chrome.service", "Service")
+By = lazy_attr("selenium.webdriver.common.by", "By")
+Keys = lazy_attr("selenium.webdriver.common.keys", "Keys")
+Options = lazy_attr("selenium.webdriver.chrome.options", "Options")
+WebDriverWait = lazy_attr("selenium.webdriver.support.ui", "WebDriverWait")
+EC = lazy_import("selenium.webdriver.support.expected_conditions")
 
 # === Imports from config ===
 from config.category_mapping import CATEGORY_WEBSITES
@@ -1,10 +1,13 @@
 import os
 import time
 import pandas as pd
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
+from utils.lazy import lazy_import, lazy_attr
+
+# Selenium and BeautifulSoup are imported on first use
+BeautifulSoup = lazy_attr("bs4", "BeautifulSoup")
+webdriver = lazy_import("selenium.webdriver")
+Service = lazy_attr("selenium.webdriver.chrome.service", "Service")
+Options = lazy_attr("selenium.webdriver.chrome.options", "Options")
 
 class FlipkartScraper:
 
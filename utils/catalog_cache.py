@@ -0,0 +1,115 @@
+# utils/catalog_cache.py
+"""
+Process-wide cache of loaded tables.
+
+Streamlit reruns and repeated queries read the same processed tables over
+and over. CATALOG_CACHE keeps what was built from a file in memory, keyed
+by (path, kind), and checks the file's size and mtime on every lookup, so
+a table rewritten by preprocessing is read again. Entries are evicted
+least recently used first once their estimated size exceeds the budget
+(SMARTBUY_CACHE_MB, 512 MB by default); an entry larger than the whole
+budget is returned without being cached.
+
+    read_cached(path, columns, price_range)     read_table through the cache
+    CATALOG_CACHE.get(path, "token_index", build)
+                                                anything else derived from the file
+
+Cached objects are shared between callers: read_cached hands out shallow
+copies, and derived objects must not be modified.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+import pandas as pd
+from utils.dtypes import memory_usage
+from utils.storage import read_table
+
+DEFAULT_BUDGET = int(os.environ.get("SMARTBUY_CACHE_MB", 512)) * 1024 * 1024
+
+
+def _nbytes(value):
+    if isinstance(value, pd.DataFrame):
+        return memory_usage(value)
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+class CatalogCache:
+    """LRU cache of objects built from files, invalidated when the file changes."""
+
+    def __init__(self, max_bytes=DEFAULT_BUDGET):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # (path, kind) → (stamp, nbytes, value)
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _stamp(path):
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def get(self, path, kind, build):
+        """Cached build(path) for (path, kind), rebuilt if the file changed since."""
+        key = (os.path.abspath(path), kind)
+        stamp = self._stamp(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        value = build(path)
+        size = _nbytes(value)
+        with self._lock:
+            self._discard(key)
+            if size <= self.max_bytes:
+                self._entries[key] = (stamp, size, value)
+                self.nbytes += size
+                while self.nbytes > self.max_bytes:
+                    self._discard(next(iter(self._entries)))
+        return value
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[1]
+
+    def invalidate(self, path=None):
+        """Drop the entries of path, or everything."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self.nbytes = 0
+                return
+            path = os.path.abspath(path)
+            for key in [k for k in self._entries if k[0] == path]:
+                self._discard(key)
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self.nbytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses}
+
+
+CATALOG_CACHE = CatalogCache()
+
+
+def read_cached(path, columns=None, price_range=None, cache=CATALOG_CACHE):
+    """read_table(path, columns, price_range), served from the whole table held in cache."""
+    df = cache.get(path, "table", read_table)
+    low, high = price_range if price_range else (None, None)
+    if "Price" in df.columns and (low is not None or high is not None):
+        keep = pd.Series(True, index=df.index)
+        if low is not None:
+            keep &= df["Price"] >= low
+        if high is not None:
+            keep &= df["Price"] <= high
+        df = df[keep.fillna(False)].reset_index(drop=True)
+    if columns is not None:
+        df = df[[c for c in df.columns if c in columns]]
+    return df.copy(deep=False)
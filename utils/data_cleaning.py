@@ -1,8 +1,16 @@
 # utils/data_cleaning.py
 
 import os
-import pandas as pd
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from utils.links import canonical_links, product_ids
+from utils.manifest import Manifest
+from utils.near_duplicates import collapse_near_duplicates
+from utils.spec_extraction import SPEC_COLUMNS, extract_specs
+from utils.storage import DEFAULT_FORMAT, FORMATS, TableWriter, table_path, write_table
 
 
 def clean_price(price):
@@ -36,26 +44,93 @@ def clean_reviews(reviews):
         return None
 
 
-def preprocess_file(input_file, output_file):
-    """Clean a single raw CSV file and save to processed folder."""
-    df = pd.read_csv(input_file)
+# === Column kernels ===
+# Vectorized equivalents of the functions above: one `.str` regex pass over
+# the column's text (str() of each cell, as the scalar functions see it)
+# and one pd.to_numeric. Columns holding values that int()/float() read but
+# the vectorized path does not (non-ASCII digits or spaces, "1_000" style
+# floats, numbers past int64) fall back to the scalar function, so results
+# match `.apply(clean_*)` exactly, dtype included.
+
+def _has_unicode_digits(values):
+    text = values.astype(str)
+    text = text[text.str.contains(r"[^\x00-\x7f]", na=False)]
+    # The non-ASCII leftovers ("₹" and the like) take only a handful of values
+    leftovers = text.str.replace(r"[\x00-\x7f]+", "", regex=True).unique()
+    return any(c.isdecimal() or c.isspace() for t in leftovers for c in t)
+
+
+def _parse_numbers(text, original, scalar_fn):
+    values = pd.to_numeric(text, errors="coerce")
+    missing = values.isna()
+    odd = text[missing].str.contains(r"_|inf|nan", case=False, na=False).any()
+    # Numbers past int64 (int() keeps them exact, as Python ints)
+    odd = odd or text.str.len().gt(18).any()
+    if odd or missing.all() or _has_unicode_digits(original):
+        # Rare inputs, and columns with nothing to parse (where .apply infers
+        # an object dtype), go through the scalar function
+        return original.apply(scalar_fn)
+    return values
+
+
+def clean_price_column(prices):
+    """"₹38,490" / "82,990" → 38490 / 82990, for a whole column."""
+    if not prices.notna().any():
+        return prices.apply(clean_price)
+    return _parse_numbers(prices.astype(str).str.replace(r"[^0-9]", "", regex=True), prices, clean_price)
+
+
+def clean_discount_column(discounts):
+    """"-27%" / "24% off" → 27 / 24, for a whole column."""
+    if not discounts.notna().any():
+        return discounts.apply(clean_discount)
+    return _parse_numbers(discounts.astype(str).str.extract(r"([0-9]+)", expand=False), discounts, clean_discount)
+
+
+def clean_rating_column(ratings):
+    """"4.4 out of 5 stars" → 4.4, for a whole column."""
+    if pd.api.types.is_numeric_dtype(ratings) or not ratings.notna().any():
+        return ratings.apply(clean_rating)
+    if ratings.dtype == object and ratings.isin([True, False]).any():
+        # float() reads non-string cells directly: float(True) is 1.0, str(True) is not a number
+        return ratings.apply(clean_rating)
+    text = ratings.astype(str)
+    first_word = text.str.replace(r" [\s\S]*", "", regex=True)   # rating.split(" ")[0]
+    text = text.where(~text.str.contains("out of", regex=False, na=False), first_word)
+    values = _parse_numbers(text, ratings, clean_rating)
+    return values if values.dtype == object else values.astype(float)
+
 
+def clean_reviews_column(reviews):
+    """"488 ratings" / "1,234" → 488 / 1234, for a whole column."""
+    if not reviews.notna().any():
+        return reviews.apply(clean_reviews)
+    return _parse_numbers(reviews.astype(str).str.replace(r"[^0-9]", "", regex=True), reviews, clean_reviews)
+
+
+def clean_frame(df):
+    """Clean the columns of a raw frame and drop rows without a price."""
     # === Clean Columns ===
     if "Price" in df.columns:
-        df["Price"] = df["Price"].apply(clean_price)
+        df["Price"] = clean_price_column(df["Price"])
 
     if "Discount" in df.columns:
-        df["Discount"] = df["Discount"].apply(clean_discount)
+        df["Discount"] = clean_discount_column(df["Discount"])
 
     if "Ratings" in df.columns:
-        df["Ratings"] = df["Ratings"].apply(clean_rating)
+        df["Ratings"] = clean_rating_column(df["Ratings"])
 
     if "Reviews Count" in df.columns:
-        df["Reviews Count"] = df["Reviews Count"].apply(clean_reviews)
+        df["Reviews Count"] = clean_reviews_column(df["Reviews Count"])
 
     if "Product" in df.columns:
         df["Product"] = df["Product"].astype(str).str.lower().str.strip()
 
+    # === Canonical product identity ===
+    if "Link" in df.columns:
+        df["Product ID"] = product_ids(df["Link"])
+        df["Link"] = canonical_links(df["Link"])
+
     # === Handle Missing Values ===
     # Drop rows with missing Price (essential field)
     if "Price" in df.columns:
@@ -66,31 +141,204 @@ def preprocess_file(input_file, output_file):
         if col in df.columns:
             df[col] = pd.to_numeric(df[col], errors="coerce")
 
+    return df
+
+
+DEDUP_COLUMNS = ["Product", "Link"]
+
+# Raw columns read as text: inferred per chunk, a column with a gap turns
+# "93" into 93.0, which clean_reviews reads as 930
+RAW_DTYPES = {"Price": str, "Discount": str, "Ratings": str, "Reviews Count": str}
+
+# Estimated title Jaccard similarity at which listings with the same specs are
+# collapsed (see utils.near_duplicates); None turns the stage off
+NEAR_DUP_THRESHOLD = 0.9
+
+
+def row_keys(df):
+    """
+    64-bit dedup key per row: the hashed Product ID, or the hashed
+    (Product, Link) for rows without one. None when there is nothing to key on.
+    """
+    subset_cols = [c for c in DEDUP_COLUMNS if c in df.columns]
+    if not subset_cols and "Product ID" not in df.columns:
+        return None
+    keys = pd.util.hash_pandas_object(df[subset_cols], index=False).to_numpy() if subset_cols \
+        else np.zeros(len(df), dtype=np.uint64)
+    if "Product ID" in df.columns:
+        ids = df["Product ID"]
+        keys = np.where(ids.notna().to_numpy(), pd.util.hash_pandas_object(ids, index=False).to_numpy(), keys)
+    return keys
+
+class KeySet:
+    """Row-key hashes seen so far, as one sorted uint64 array (8 bytes per key)."""
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.uint64)
+
+    def add(self, hashes):
+        """Add hashes; return a mask of the rows whose key was not seen before (first occurrence wins)."""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        new = np.zeros(len(hashes), dtype=bool)
+        new[np.unique(hashes, return_index=True)[1]] = True
+        if len(self.keys):
+            pos = np.minimum(np.searchsorted(self.keys, hashes), len(self.keys) - 1)
+            new &= self.keys[pos] != hashes
+        self.keys = np.union1d(self.keys, hashes[new])
+        return new
+
+
+def _preprocess_chunked(input_file, output_file, chunksize, near_dup_threshold):
+    """
+    preprocess_file for files too large to load at once: clean and append
+    `chunksize` rows at a time. Duplicates across chunks are found through
+    the 64-bit row_keys, so memory grows by 8 bytes per
+    distinct row rather than with the file. Near-duplicates are collapsed
+    within each chunk only.
+    """
+    seen = KeySet()
+    rows = 0
+    with TableWriter(output_file) as writer:
+        for chunk in pd.read_csv(input_file, chunksize=chunksize, dtype=RAW_DTYPES):
+            chunk = clean_frame(chunk)
+
+            keys = row_keys(chunk)
+            if keys is not None:
+                chunk = chunk[seen.add(keys)]
+
+            if "Product" in chunk.columns:
+                chunk[SPEC_COLUMNS] = extract_specs(chunk["Product"])
+                if near_dup_threshold is not None:
+                    chunk = collapse_near_duplicates(chunk, near_dup_threshold)
+
+            writer.write(chunk)
+            rows += len(chunk)
+    return rows
+
+
+def preprocess_file(input_file, output_file, chunksize=None, near_dup_threshold=NEAR_DUP_THRESHOLD):
+    """
+    Clean a single raw CSV file and save to processed folder, in the table
+    format of output_file's extension (see utils.storage). Returns the number
+    of rows written. With chunksize, the file is streamed `chunksize` rows at a time.
+    Listings without a Product ID whose titles reach near_dup_threshold
+    estimated Jaccard similarity and whose specs agree are collapsed into one
+    row, which lists the others' links in "Collapsed IDs"; None keeps them all.
+    """
+    if chunksize:
+        rows = _preprocess_chunked(input_file, output_file, chunksize, near_dup_threshold)
+        print(f"✅ Processed: {input_file} → {output_file}")
+        return rows
+
+    df = clean_frame(pd.read_csv(input_file, dtype=RAW_DTYPES))
+
     # === Remove duplicates ===
-    subset_cols = [c for c in ["Product", "Link"] if c in df.columns]
-    if subset_cols:
-        df = df.drop_duplicates(subset=subset_cols, keep="first")
+    keys = row_keys(df)
+    if keys is not None:
+        df = df[~pd.Series(keys).duplicated(keep="first").to_numpy()]
+
+    # === Extract specs from titles ===
+    if "Product" in df.columns:
+        df[SPEC_COLUMNS] = extract_specs(df["Product"])
+
+    # === Collapse near-duplicate titles ===
+    if near_dup_threshold is not None:
+        df = collapse_near_duplicates(df, near_dup_threshold)
 
     # === Save processed data ===
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    df.to_csv(output_file, index=False, encoding="utf-8-sig")
+    write_table(df, output_file)
 
     print(f"✅ Processed: {input_file} → {output_file}")
+    return len(df)
+
+
+def raw_files(raw_dir, category=None, query=None):
+    """Raw CSVs in raw_dir, optionally only those named {site}_{category}_{query}.csv."""
+    files = sorted(f for f in os.listdir(raw_dir) if f.endswith(".csv"))
+    if category is not None and query is not None:
+        files = [f for f in files if f.endswith(f"_{category}_{query}.csv")]
+    return files
+
+
+def _preprocess_task(task):
+    """Process one file, catching its errors so other files still run."""
+    input_file, output_file, chunksize, near_dup_threshold = task
+    start = time.perf_counter()
+    result = {"file": os.path.basename(input_file), "rows": None, "error": None, "entry": None}
+    try:
+        result["entry"] = Manifest.snapshot(input_file)
+        result["rows"] = preprocess_file(input_file, output_file, chunksize, near_dup_threshold)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - start
+    return result
 
 
-def preprocess_all():
-    """Process all raw CSV files in data/raw → data/processed"""
+def preprocess_all(category=None, query=None, force=False, workers=1, chunksize=None,
+                   fmt=DEFAULT_FORMAT, near_dup_threshold=NEAR_DUP_THRESHOLD):
+    """
+    Process raw CSV files in data/raw → data/processed. Files already
+    processed in their current state (see utils.manifest) are skipped unless
+    force is set; category and query restrict the run to that search.
+
+    With workers > 1 (None: all cores) files are cleaned in a process pool.
+    A file that fails is reported and left out of the manifest without
+    stopping the others. chunksize streams each file (see
+    _preprocess_chunked). fmt is the storage format of the processed tables
+    ("parquet", "feather" or "csv"); near_dup_threshold is passed to
+    preprocess_file (the manifest does not record it, so use force after
+    changing it). Returns one result dict per processed file
+    (file, rows, seconds, error) in file-name order.
+    """
     raw_dir = os.path.join(os.path.dirname(__file__), "..", "data", "raw")
     processed_dir = os.path.join(os.path.dirname(__file__), "..", "data", "processed")
 
     os.makedirs(processed_dir, exist_ok=True)
+    manifest = Manifest(processed_dir)
+
+    tasks, skipped = [], 0
+    for file in raw_files(raw_dir, category, query):
+        input_file = os.path.join(raw_dir, file)
+        output_file = table_path(os.path.join(processed_dir, file[:-len(".csv")]), fmt)  # keep same name
+        if not force and manifest.is_current(input_file, output_file):
+            skipped += 1
+            continue
+        tasks.append((input_file, output_file, chunksize, near_dup_threshold))
+
+    if workers == 1 or len(tasks) < 2:
+        results = [_preprocess_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_preprocess_task, tasks))
 
-    for file in os.listdir(raw_dir):
-        if file.endswith(".csv"):
-            input_file = os.path.join(raw_dir, file)
-            output_file = os.path.join(processed_dir, file)  # keep same name
-            preprocess_file(input_file, output_file)
+    for (input_file, output_file, *_), r in zip(tasks, results):
+        entry = r.pop("entry")
+        if r["error"]:
+            print(f"[ERROR] {r['file']}: {r['error']} ({r['seconds']:.2f}s)")
+        else:
+            manifest.record(input_file, output_file, entry)
+            print(f"[INFO] {r['file']}: {r['rows']} rows ({r['seconds']:.2f}s)")
+
+    manifest.save()
+    if skipped:
+        print(f"[INFO] {skipped} raw file(s) unchanged since last run, skipped")
+    return results
 
 
 if __name__ == "__main__":
-    preprocess_all()
+    import argparse
+    parser = argparse.ArgumentParser(description="Clean raw CSVs into data/processed")
+    parser.add_argument("--category", help="Only this category (with --query)")
+    parser.add_argument("--query", help="Only this query (with --category)")
+    parser.add_argument("--force", action="store_true", help="Reprocess files even if unchanged")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (0: all cores)")
+    parser.add_argument("--chunksize", type=int, default=None, help="Stream files this many rows at a time")
+    parser.add_argument("--format", default=DEFAULT_FORMAT, choices=FORMATS, help="Processed table format")
+    parser.add_argument("--near-dup-threshold", type=float, default=NEAR_DUP_THRESHOLD,
+                        help="Title Jaccard similarity at which same-spec listings are collapsed (0: off)")
+    args = parser.parse_args()
+
+    # Workers must resolve _preprocess_task by module name, not via __main__
+    from utils.data_cleaning import preprocess_all
+    preprocess_all(args.category, args.query, args.force, args.workers or None, args.chunksize,
+                   args.format, args.near_dup_threshold or None)
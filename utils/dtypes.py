@@ -0,0 +1,71 @@
+# utils/dtypes.py
+"""
+Compact in-memory dtypes for loaded catalogs.
+
+Every loader names its columns differently ("Price", "price", "Website",
+"platform", ...), so optimize_dtypes matches them case-insensitively with
+spaces read as underscores:
+
+    website / platform / category / brand / cpu / colour    category
+    price, reviews_count                                    int32 (Int32 with missing values)
+    discount                                                uint8 (UInt8 with missing values)
+    ratings / rating                                        float32
+    link                                                    canonical URL (utils.links), Arrow string
+    other text                                              Arrow string
+
+Integer columns whose values do not fit the narrow type are left alone.
+"""
+import numpy as np
+import pandas as pd
+from utils.links import canonical_links
+
+CATEGORICAL = {"website", "platform", "category", "brand", "cpu", "colour"}
+INTEGER = {"price": "int32", "reviews_count": "int32", "discount": "uint8"}
+NULLABLE = {"int32": "Int32", "uint8": "UInt8"}
+FLOAT = {"ratings": "float32", "rating": "float32"}
+
+
+def _string_dtype():
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)
+    except (ImportError, TypeError):
+        return None
+
+
+STRING_DTYPE = _string_dtype()
+
+
+def _narrow_int(values, dtype):
+    numbers = pd.to_numeric(values, errors="coerce")
+    info = np.iinfo(dtype)
+    if numbers.notna().any() and (numbers.min() < info.min or numbers.max() > info.max):
+        return values
+    if (numbers.dropna() % 1 != 0).any():
+        return values
+    return numbers.astype(NULLABLE[dtype] if numbers.isna().any() else dtype)
+
+
+def optimize_dtypes(df):
+    """Return df with the compact dtypes above (columns it does not know stay as they are)."""
+    columns = {}
+    for col in df.columns:
+        key = str(col).strip().lower().replace(" ", "_")
+        values = df[col]
+        if key in CATEGORICAL:
+            values = values.astype("category")
+        elif key in INTEGER:
+            values = _narrow_int(values, INTEGER[key])
+        elif key in FLOAT:
+            values = pd.to_numeric(values, errors="coerce").astype(FLOAT[key])
+        elif key == "link":
+            values = canonical_links(values)
+        if STRING_DTYPE is not None and not isinstance(values.dtype, pd.CategoricalDtype) \
+                and pd.api.types.is_string_dtype(values):
+            values = values.astype(STRING_DTYPE)
+        columns[col] = values
+    return pd.DataFrame(columns, index=df.index)
+
+
+def memory_usage(df):
+    """Deep memory usage of df in bytes."""
+    return int(df.memory_usage(deep=True).sum())
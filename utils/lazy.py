@@ -0,0 +1,60 @@
+# utils/lazy.py
+"""
+Load heavy modules and objects on first use.
+
+    webdriver = lazy_import("selenium.webdriver")
+    By = lazy_attr("selenium.webdriver.common.by", "By")
+    MODEL = LazyResource(lambda: SentenceTransformer("all-MiniLM-L6-v2"))
+
+Attribute access and calls on the proxy are forwarded to the real object,
+which is built once (thread-safe) the first time it is needed.
+"""
+import importlib
+import threading
+
+_UNSET = object()
+_INTERNALS = ("_factory", "_name", "_lock", "_value")
+
+
+class LazyResource:
+
+    def __init__(self, factory, name=None):
+        self._factory = factory
+        self._name = name or getattr(factory, "__name__", "resource")
+        self._lock = threading.Lock()
+        self._value = _UNSET
+
+    def get(self):
+        """Build the resource on first call and return it."""
+        if self._value is _UNSET:
+            with self._lock:
+                if self._value is _UNSET:
+                    self._value = self._factory()
+        return self._value
+
+    @property
+    def loaded(self):
+        return self._value is not _UNSET
+
+    def __getattr__(self, attr):
+        if attr in _INTERNALS:
+            raise AttributeError(attr)
+        return getattr(self.get(), attr)
+
+    def __call__(self, *args, **kwargs):
+        return self.get()(*args, **kwargs)
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<LazyResource {self._name} ({state})>"
+
+
+def lazy_import(module_name):
+    """Proxy for a module that is imported on first attribute access."""
+    return LazyResource(lambda: importlib.import_module(module_name), module_name)
+
+
+def lazy_attr(module_name, attr):
+    """Proxy for `from module_name import attr`, resolved on first use."""
+    return LazyResource(lambda: getattr(importlib.import_module(module_name), attr),
+                        f"{module_name}.{attr}")
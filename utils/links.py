@@ -0,0 +1,69 @@
+# utils/links.py
+"""
+Canonical product URLs.
+
+Scraped links carry per-impression tracking: Amazon sponsored results are
+/sspa/click redirects with the product path URL-encoded in `url=`, and
+organic ones append /ref=... plus a long query string; Flipkart appends
+lid, iid, ssid and search parameters to every item URL. canonical_links
+reduces them to the product page:
+
+    https://www.amazon.in/dp/B0DZDDK22Z
+    https://www.flipkart.com/apple-macbook-air-m2-.../p/itmdc5308fa78421?pid=COMH64PY76CJKBYU
+
+The site is read from the host, so Croma or Reliance links that happen to
+carry a pid= or /dp/ are never taken for Flipkart or Amazon ones. Links of
+other shapes or sites are returned unchanged. product_ids gives the short
+key each canonical URL is built on, prefixed with the site:
+
+    amazon:B0DZDDK22Z
+    flipkart:COMH64PY76CJKBYU      (flipkart:itm... when there is no pid)
+
+Links on other sites have no product ID (NaN).
+"""
+import re
+
+HOST_PATTERN = re.compile(r"^(https?://[^/?#]+)")
+AMAZON_HOST_PATTERN = r"^https?://(?:[^/?#]*\.)?amazon\.(?:com|in|co\.[a-z]{2}|[a-z]{2})(?::\d+)?$"
+FLIPKART_HOST_PATTERN = r"^https?://(?:[^/?#]*\.)?flipkart\.com(?::\d+)?$"
+AMAZON_ASIN_PATTERN = re.compile(r"(?:/dp/|/gp/product/)([A-Z0-9]{10})(?:[/?&#]|$)")
+FLIPKART_ITEM_PATTERN = re.compile(r"^(https?://[^/?#]+/[^?#]*/p/itm[0-9a-z]+)")
+FLIPKART_PID_PATTERN = re.compile(r"[?&]pid=([A-Z0-9]+)")
+FLIPKART_ITM_PATTERN = re.compile(r"/p/(itm[0-9a-z]+)")
+
+
+def _sites(links):
+    """(host, is_amazon, is_flipkart) for a str Series of links."""
+    host = links.str.extract(HOST_PATTERN, expand=False)
+    lowered = host.str.lower()
+    return (host, lowered.str.contains(AMAZON_HOST_PATTERN, regex=True, na=False),
+            lowered.str.contains(FLIPKART_HOST_PATTERN, regex=True, na=False))
+
+
+def _amazon_asins(links):
+    # sspa/click redirects carry the product path as url=%2F...%2Fdp%2F<ASIN>%2F...
+    decoded = links.str.replace(r"%2[fF]", "/", regex=True)
+    return decoded.str.extract(AMAZON_ASIN_PATTERN, expand=False)
+
+
+def product_ids(links):
+    """Series of links → site-prefixed product keys (NaN when the link has none)."""
+    links = links.astype("str")
+    _, is_amazon, is_flipkart = _sites(links)
+    amazon = _amazon_asins(links).where(is_amazon)
+    flipkart = links.str.extract(FLIPKART_PID_PATTERN, expand=False).fillna(
+        links.str.extract(FLIPKART_ITM_PATTERN, expand=False)).where(is_flipkart)
+    return ("amazon:" + amazon).fillna("flipkart:" + flipkart)
+
+
+def canonical_links(links):
+    """Series of links → Series of tracking-free product URLs (NaN stays NaN)."""
+    links = links.astype("str")
+    host, is_amazon, is_flipkart = _sites(links)
+    amazon = (host + "/dp/" + _amazon_asins(links)).where(is_amazon)
+
+    item = links.str.extract(FLIPKART_ITEM_PATTERN, expand=False)
+    pid = links.str.extract(FLIPKART_PID_PATTERN, expand=False)
+    flipkart = (item + ("?pid=" + pid).fillna("")).where(is_flipkart)
+
+    return amazon.fillna(flipkart).fillna(links)
@@ -0,0 +1,84 @@
+# utils/manifest.py
+"""
+Record of which raw files preprocess_all has already cleaned.
+
+data/processed/manifest.json holds the size, mtime and content hash of
+each raw CSV when it was last processed, plus a hash of the cleaning code.
+A raw file is stale when it is new, its output is missing or in another
+format, its content changed (size/mtime are checked first, so unchanged
+files are not re-read), or the cleaning code changed since the manifest
+was written.
+"""
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = "manifest.json"
+
+# Modules whose source decides what a processed file contains
+CLEANING_SOURCES = ["data_cleaning.py", "spec_extraction.py", "storage.py", "links.py",
+                    "near_duplicates.py"]
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cleaning_version():
+    """Hash of the cleaning code, so a code change reprocesses every file."""
+    digest = hashlib.sha1()
+    for name in CLEANING_SOURCES:
+        with open(os.path.join(os.path.dirname(__file__), name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+class Manifest:
+
+    def __init__(self, processed_dir):
+        self.path = os.path.join(processed_dir, MANIFEST_NAME)
+        self.processed_dir = processed_dir
+        self.version = cleaning_version()
+        self.files = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("version") == self.version:
+                self.files = saved.get("files", {})
+
+    def is_current(self, input_file, output_file):
+        """True when input_file was processed in its present state by this code into output_file."""
+        entry = self.files.get(os.path.basename(input_file))
+        if entry is None or entry.get("output") != os.path.basename(output_file) \
+                or not os.path.exists(output_file):
+            return False
+        stat = os.stat(input_file)
+        if stat.st_size != entry["size"]:
+            return False
+        if stat.st_mtime_ns == entry["mtime_ns"]:
+            return True
+        # Touched but maybe not changed: compare contents and remember the new mtime
+        if file_hash(input_file) != entry["sha1"]:
+            return False
+        entry["mtime_ns"] = stat.st_mtime_ns
+        return True
+
+    @staticmethod
+    def snapshot(input_file):
+        """Manifest entry for input_file as it is now; take it before processing."""
+        stat = os.stat(input_file)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": file_hash(input_file)}
+
+    def record(self, input_file, output_file, entry):
+        self.files[os.path.basename(input_file)] = dict(entry, output=os.path.basename(output_file))
+
+    def save(self):
+        os.makedirs(self.processed_dir, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "files": self.files}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
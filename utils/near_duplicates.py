@@ -0,0 +1,154 @@
+# utils/near_duplicates.py
+"""
+Near-duplicate listings without a Product ID within one site's table.
+
+Exact dedup on the Product ID (utils.data_cleaning.row_keys) already joins
+every copy of a listing whose link carries an ASIN or PID, and two
+different IDs are different products. Rows without an ID fall back to
+(title, link) keys, and sponsored and organic copies of the same item
+often differ by a word or two in the title, so exact dedup keeps both;
+this stage only looks at those rows. Titles are normalized and cut into
+word k-shingles; each title gets a MinHash signature, and LSH banding puts
+titles that agree on a whole band of the signature in the same bucket. Only
+titles sharing a bucket are compared, so the stage runs in roughly linear
+time. A pair is collapsed when its estimated Jaccard similarity reaches the
+threshold and the guard columns (the extracted specs and the price) agree,
+so variants that differ in RAM, storage, colour or price are kept apart.
+Titles the site truncated with "..." are left out of the stage too, since
+the specs that would tell them apart are usually past the cut.
+
+collapse_near_duplicates keeps the first row of each group and records the
+links of the rows it absorbed in "Collapsed IDs" (row labels when there is
+no Link column; NaN for rows that absorbed none).
+"""
+import re
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+# Signatures are uint32; a title with no shingles keeps MAX_HASH everywhere
+MAX_HASH = np.uint32(0xFFFFFFFF)
+
+GUARD_COLUMNS = ["Brand", "Model Code", "CPU", "RAM", "Storage", "Screen Size", "Colour", "Price"]
+
+# Titles the site cut short ("... (8 GB/512 GB SSD/Mac..."): the specs that
+# tell variants apart are often past the cut, so they are never collapsed
+TRUNCATED_PATTERN = r"(?:\.\.\.|…)\s*$"
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+
+def shingles(title, k=2):
+    tokens = TOKEN_PATTERN.findall(str(title).lower())
+    if len(tokens) < k:
+        return [" ".join(tokens)] if tokens else []
+    return [" ".join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)]
+
+
+def lsh_params(threshold, num_perm):
+    """(bands, rows) with bands * rows <= num_perm whose S-curve midpoint is nearest the threshold."""
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        midpoint = (1 / bands) ** (1 / rows)
+        if best is None or abs(midpoint - threshold) < best[0]:
+            best = (abs(midpoint - threshold), bands, rows)
+    return best[1], best[2]
+
+
+def minhash_signatures(titles, num_perm=64, k=2, seed=1, batch_shingles=250_000):
+    """(len(titles), num_perm) uint32 MinHash signatures; titles without shingles get MAX_HASH."""
+    rng = np.random.default_rng(seed)
+    # Multiply-shift hashing: the high 32 bits of a * x + b (mod 2**64), a odd
+    a = rng.integers(0, 2 ** 63, size=(num_perm, 1), dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.integers(0, 2 ** 63, size=(num_perm, 1), dtype=np.uint64)
+
+    doc_shingles = [shingles(t, k) for t in titles]
+    counts = np.fromiter((len(s) for s in doc_shingles), dtype=np.int64, count=len(doc_shingles))
+    flat = np.array([s for doc in doc_shingles for s in doc], dtype=object)
+    owner = np.repeat(np.arange(len(titles)), counts)
+
+    # Hash each distinct shingle once per batch; titles share most of their shingles
+    codes, vocabulary = pd.factorize(flat)
+    hashes = pd.util.hash_array(np.asarray(vocabulary, dtype=object)) & np.uint64(0xFFFFFFFF)
+
+    signatures = np.full((num_perm, len(titles)), MAX_HASH, dtype=np.uint32)
+    for start in range(0, len(codes), batch_shingles):
+        docs = owner[start:start + batch_shingles]
+        distinct, inverse = np.unique(codes[start:start + batch_shingles], return_inverse=True)
+        with np.errstate(over="ignore"):
+            permuted = ((a * hashes[distinct] + b) >> np.uint64(32)).astype(np.uint32)
+        # Shingles of one title are contiguous: reduce per run of equal owners
+        starts = np.flatnonzero(np.r_[True, docs[1:] != docs[:-1]])
+        mins = np.minimum.reduceat(permuted[:, inverse], starts, axis=1)
+        run_docs = docs[starts]
+        signatures[:, run_docs] = np.minimum(signatures[:, run_docs], mins)
+    return np.ascontiguousarray(signatures.T)
+
+
+def near_duplicate_groups(titles, threshold=0.9, num_perm=64, k=2, guard=None):
+    """
+    Component label per title (equal labels are near-duplicates). guard is an
+    optional uint64 key per title; only titles with equal keys are joined.
+    """
+    n = len(titles)
+    if n < 2:
+        return np.arange(n)
+    signatures = minhash_signatures(titles, num_perm, k)
+    has_shingles = (signatures != MAX_HASH).any(axis=1)
+    guard = np.asarray(guard, dtype=np.uint64) if guard is not None else np.zeros(n, dtype=np.uint64)
+
+    bands, rows = lsh_params(threshold, num_perm)
+    left, right = [], []
+    for band in range(bands):
+        band_hash = pd.util.hash_pandas_object(
+            pd.DataFrame(signatures[:, band * rows:(band + 1) * rows]), index=False).to_numpy()
+        band_hash = band_hash ^ guard
+        candidates = np.flatnonzero(has_shingles)
+        order = candidates[np.argsort(band_hash[candidates], kind="stable")]
+        keys = band_hash[order]
+        # Compare each bucket member to the first member of its bucket
+        first = np.r_[True, keys[1:] != keys[:-1]]
+        head = order[np.maximum.accumulate(np.where(first, np.arange(len(order)), 0))]
+        members = ~first
+        left.append(head[members])
+        right.append(order[members])
+
+    left, right = np.concatenate(left), np.concatenate(right)
+    if len(left):
+        pairs = np.unique(np.stack([left, right], axis=1), axis=0)
+        left, right = pairs[:, 0], pairs[:, 1]
+        similarity = (signatures[left] == signatures[right]).mean(axis=1)
+        keep = (similarity >= threshold) & (guard[left] == guard[right])
+        left, right = left[keep], right[keep]
+    graph = sparse.coo_matrix((np.ones(len(left), dtype=np.int8), (left, right)), shape=(n, n))
+    return connected_components(graph, directed=False)[1]
+
+
+def collapse_near_duplicates(df, threshold=0.9, num_perm=64, k=2, guard_columns=GUARD_COLUMNS):
+    """
+    Keep the first row of each near-duplicate group among the rows of df
+    without a Product ID; list the links of the rest in "Collapsed IDs".
+    """
+    if "Product" not in df.columns:
+        return df
+    skip = df["Product"].astype(str).str.contains(TRUNCATED_PATTERN, regex=True, na=False)
+    if "Product ID" in df.columns:
+        skip |= df["Product ID"].notna()
+    rows = np.flatnonzero(~skip.to_numpy())
+
+    # Skipped rows keep their own label; the rest are labelled past len(df)
+    labels = np.arange(len(df))
+    if len(rows) > 1:
+        subset = df.iloc[rows]
+        guard_cols = [c for c in guard_columns if c in df.columns]
+        guard = pd.util.hash_pandas_object(subset[guard_cols], index=False).to_numpy() if guard_cols else None
+        labels[rows] = len(df) + near_duplicate_groups(subset["Product"].tolist(), threshold, num_perm, k, guard)
+
+    first = ~pd.Series(labels).duplicated().to_numpy()
+    links = df["Link"].astype(str) if "Link" in df.columns else pd.Series(df.index.astype(str), index=df.index)
+    absorbed = pd.Series(links.to_numpy()[~first], dtype=object).groupby(labels[~first]).agg("|".join)
+    kept = df[first].copy()
+    kept["Collapsed IDs"] = pd.Series(labels[first]).map(absorbed).to_numpy()
+    return kept
@@ -0,0 +1,101 @@
+# utils/spec_extraction.py
+"""
+Parse structured specs out of product titles.
+
+extract_specs works on a whole column with vectorized `str.extract` and the
+precompiled patterns below; preprocess_file stores its output next to the
+cleaned columns so matching and filtering never re-parse titles.
+
+    Brand        known brand name          "apple"
+    Model Code   maker's part number       "e1404fa-nk5542ws", "mc6t4hn"
+    CPU          processor family          "m4", "i5", "ryzen 5", "ultra 7"
+    RAM          memory in GB              16
+    Storage      storage in GB             512
+    Screen Size  diagonal in inches        15.6
+    Colour       finish                    "midnight", "space grey"
+"""
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+KNOWN_BRANDS = [
+    "apple", "asus", "acer", "dell", "hp", "lenovo", "msi", "samsung",
+    "microsoft", "lg", "gigabyte", "infinix", "xiaomi", "redmi", "honor",
+    "huawei", "avita", "chuwi", "primebook", "zebronics", "ultimus",
+]
+
+SPEC_COLUMNS = ["Brand", "Model Code", "CPU", "RAM", "Storage", "Screen Size", "Colour"]
+
+BRAND_PATTERN = re.compile(r"\b(" + "|".join(sorted(KNOWN_BRANDS, key=len, reverse=True)) + r")\b")
+
+# A 5+ character token mixing letters and digits that is not a spec fragment
+# such as "13th", "16gb", "1335u", "i5-1335u", "1135g7", "r7-350", "n4500",
+# "10-core", "ddr4" or "win11". Titles name the processor before the part
+# number ("... 10th gen 1005g1 - (8 gb/512 gb ssd) x515ja-bq322ws"), so the
+# last such token is taken.
+MODEL_CODE_PATTERN = re.compile(
+    r"(?<![\w.-])"
+    r"(?!(?:\d+-?[a-z]{0,4}|\d+-\d+[a-z]*|\d+-in-\d+|(?:lp|g)?ddr\d\w*|win\d+\w*|m365|office\d*"
+    r"|\d{4,5}g\d\w*|i[3579]-\w+|r[3579]-\w+|n\d{4}|[rg]tx\d+\w*|rx\d+\w*|usb\w*|hdmi\w*|wi-?fi\w*)(?![\w-]))"
+    r"(?=[a-z0-9-]{5,})(?=[a-z0-9-]*\d)(?=[a-z0-9-]*[a-z])"
+    r"([a-z0-9]+(?:-[a-z0-9]+)*)(?![\w-])"
+)
+# The greedy prefix makes str.extract return the last match
+LAST_MODEL_CODE_PATTERN = re.compile(r"^.*" + MODEL_CODE_PATTERN.pattern, re.DOTALL)
+
+CPU_PATTERN = re.compile(
+    r"\b(m[1-4](?:\s(?:pro|max))?|i[3579]|ultra\s?[579]|ryzen\s?[3579]"
+    r"|celeron|pentium|athlon|snapdragon|mediatek)\b(?!\.)"
+)
+
+RAM_PATTERN = re.compile(
+    r"\b(\d{1,2})\s?gb\b(?!\s*(?:ssd|hdd|emmc|storage|radeon|graphics|gddr\d?|vram|nvidia))"
+)
+
+STORAGE_PATTERN = re.compile(r"\b(?:(\d{3,4})\s?gb|(\d)\s?tb)\b")
+
+SCREEN_INCH_PATTERN = re.compile(r"(?<![\d.])(\d{2}(?:\.\d{1,2})?)\s?-?\s?(?:inch(?:es)?\b|in\b|\"|''|″)")
+
+SCREEN_CM_PATTERN = re.compile(r"(?<![\d.])(\d{2}\.\d{1,2})\s?cm\b")
+
+COLOUR_PATTERN = re.compile(
+    r"\b(space\s(?:grey|gray|black)|sky\sblue|platinum\ssilver|natural\ssilver|steel\sgr[ae]y"
+    r"|rose\sgold|midnight|starlight|silver|gold|black|white|blue|gr[ae]y|green|pink|purple|red)\b"
+)
+
+
+def extract_specs(titles):
+    """Return a frame of SPEC_COLUMNS parsed from a Series of product titles."""
+    titles = titles.astype(str).str.lower()
+
+    storage = titles.str.extract(STORAGE_PATTERN)
+    storage_gb = pd.to_numeric(storage[0], errors="coerce").fillna(
+        pd.to_numeric(storage[1], errors="coerce") * 1024
+    )
+
+    inches = pd.to_numeric(titles.str.extract(SCREEN_INCH_PATTERN, expand=False), errors="coerce")
+    from_cm = (pd.to_numeric(titles.str.extract(SCREEN_CM_PATTERN, expand=False), errors="coerce") / 2.54).round(1)
+    screen = inches.fillna(from_cm)
+    screen = screen.where(screen.between(10, 18))
+
+    cpu = titles.str.extract(CPU_PATTERN, expand=False).str.replace(r"\s+", " ", regex=True)
+    cpu = cpu.str.replace(r"^(ultra|ryzen)(\d)", r"\1 \2", regex=True)
+    colour = titles.str.extract(COLOUR_PATTERN, expand=False).str.replace("gray", "grey").str.replace(r"\s+", " ", regex=True)
+
+    return pd.DataFrame({
+        "Brand": titles.str.extract(BRAND_PATTERN, expand=False),
+        "Model Code": titles.str.extract(LAST_MODEL_CODE_PATTERN, expand=False),
+        "CPU": cpu,
+        "RAM": pd.to_numeric(titles.str.extract(RAM_PATTERN, expand=False), errors="coerce").astype("Int16"),
+        "Storage": storage_gb.astype("Int32"),
+        "Screen Size": screen.astype(np.float32),
+        "Colour": colour,
+    }, index=titles.index)
+
+
+@lru_cache(maxsize=65536)
+def parse_title(title):
+    """Specs of a single title, as a dict keyed by SPEC_COLUMNS (None when missing)."""
+    row = extract_specs(pd.Series([title])).iloc[0]
+    return {col: (None if pd.isna(row[col]) else row[col]) for col in SPEC_COLUMNS}
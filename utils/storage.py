@@ -0,0 +1,239 @@
+# utils/storage.py
+"""
+Storage for processed and matched tables.
+
+A table is one file: Parquet (the default), uncompressed Feather, or CSV,
+chosen by the file extension. Writers apply PROCESSED_DTYPES, so readers
+get the same types back without inferring them from text. When a stem
+exists in several formats, readers use the first one in FORMATS, so
+directories that still hold CSVs keep working.
+
+    write_table(df, path)                       atomic write, replaces other formats of the stem
+    TableWriter(path)                           the same, appended chunk by chunk
+    read_table(path, columns, price_range)      column projection; the Price range is
+                                                pushed down to Parquet row groups;
+                                                Parquet/Feather are memory-mapped
+    load_catalog(category, query, sites)        {site: frame}, reading only the sites asked for
+                                                (through utils.catalog_cache when repeated)
+    export_csv(path)                            CSV copy under data/export
+
+Parquet and Feather need pyarrow; without it DEFAULT_FORMAT is CSV.
+"""
+import importlib.util
+import os
+import pandas as pd
+from utils.lazy import lazy_import
+
+pa = lazy_import("pyarrow")
+pc = lazy_import("pyarrow.compute")
+pq = lazy_import("pyarrow.parquet")
+ipc = lazy_import("pyarrow.ipc")
+
+PROCESSED_DIR = "data/processed"
+EXPORT_DIR = "data/export"
+
+EXTENSIONS = {"parquet": ".parquet", "feather": ".feather", "csv": ".csv"}
+FORMATS = list(EXTENSIONS)
+DEFAULT_FORMAT = "parquet" if importlib.util.find_spec("pyarrow") else "csv"
+
+PROCESSED_DTYPES = {
+    "Product": "str",
+    "Price": "Int64",
+    "Discount": "Int64",
+    "Ratings": "float64",
+    "Reviews Count": "Int64",
+    "Category": "str",
+    "Link": "str",
+    "Product ID": "str",
+    "Brand": "str",
+    "Model Code": "str",
+    "CPU": "str",
+    "RAM": "Int16",
+    "Storage": "Int32",
+    "Screen Size": "float32",
+    "Colour": "str",
+    "Collapsed IDs": "str",
+}
+
+# Parquet row groups small enough for the Price statistics to skip some
+ROW_GROUP_SIZE = 64_000
+
+
+def table_format(path):
+    for fmt, ext in EXTENSIONS.items():
+        if path.endswith(ext):
+            return fmt
+    raise ValueError(f"Unknown table format for '{path}', expected one of {sorted(EXTENSIONS.values())}")
+
+
+def table_path(stem, fmt=DEFAULT_FORMAT):
+    return stem + EXTENSIONS[fmt]
+
+
+def find_table(stem):
+    """Path of the stored table for stem (path without extension), or None."""
+    for fmt in FORMATS:
+        path = table_path(stem, fmt)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def list_tables(directory):
+    """{stem: path} for every table in directory, one path per stem."""
+    stems = set()
+    for file in os.listdir(directory):
+        for ext in EXTENSIONS.values():
+            if file.endswith(ext):
+                stems.add(os.path.join(directory, file[:-len(ext)]))
+    return {stem: find_table(stem) for stem in sorted(stems)}
+
+
+def coerce_dtypes(df):
+    """Cast the known processed columns to PROCESSED_DTYPES."""
+    known = {col: dtype for col, dtype in PROCESSED_DTYPES.items() if col in df.columns}
+    return df.astype(known) if known else df
+
+
+def _remove_other_formats(path):
+    stem = path[:-len(EXTENSIONS[table_format(path)])]
+    for fmt in FORMATS:
+        other = table_path(stem, fmt)
+        if other != path and os.path.exists(other):
+            os.remove(other)
+
+
+class TableWriter:
+    """Write a table chunk by chunk; the file appears at `path` only on a clean close."""
+
+    def __init__(self, path):
+        self.path = path
+        self.fmt = table_format(path)
+        self.tmp_path = path + ".tmp"
+        self._writer = None
+        self._schema = None
+
+    def __enter__(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.fmt == "csv":
+            self._writer = open(self.tmp_path, "w", encoding="utf-8-sig", newline="")
+        return self
+
+    def write(self, df):
+        df = coerce_dtypes(df)
+        if self.fmt == "csv":
+            df.to_csv(self._writer, index=False, header=self._schema is None)
+            self._schema = list(df.columns)
+            return
+        table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+        if self._writer is None:
+            self._schema = table.schema
+            if self.fmt == "parquet":
+                self._writer = pq.ParquetWriter(self.tmp_path, self._schema)
+            else:
+                self._writer = ipc.new_file(self.tmp_path, self._schema)
+        if self.fmt == "parquet":
+            self._writer.write_table(table, row_group_size=ROW_GROUP_SIZE)
+        else:
+            self._writer.write_table(table)
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._writer is not None:
+            self._writer.close()
+        if exc_type is not None:
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+            return False
+        if self._writer is None:
+            # No chunks: nothing to write a schema from
+            open(self.tmp_path, "w").close()
+        os.replace(self.tmp_path, self.path)
+        _remove_other_formats(self.path)
+        return False
+
+
+def write_table(df, path):
+    """Write df to path in the format of its extension."""
+    with TableWriter(path) as writer:
+        writer.write(df)
+
+
+def read_table(path, columns=None, price_range=None):
+    """
+    Read a table, keeping only `columns` (those present) and rows whose
+    Price lies in price_range = (low, high), either bound optional.
+    """
+    fmt = table_format(path)
+    low, high = price_range if price_range else (None, None)
+
+    if fmt == "csv":
+        if os.path.getsize(path) == 0:
+            return pd.DataFrame()
+        usecols = (lambda c: c in columns or c == "Price") if columns is not None else None
+        df = pd.read_csv(path, usecols=usecols, dtype=PROCESSED_DTYPES)
+        if low is not None:
+            df = df[df["Price"] >= low]
+        if high is not None:
+            df = df[df["Price"] <= high]
+        if columns is not None:
+            df = df[[c for c in df.columns if c in columns]]
+        return df.reset_index(drop=True)
+
+    if os.path.getsize(path) == 0:
+        return pd.DataFrame()
+    if fmt == "parquet":
+        names = pq.read_schema(path, memory_map=True).names
+        filters = []
+        if low is not None:
+            filters.append(("Price", ">=", low))
+        if high is not None:
+            filters.append(("Price", "<=", high))
+        table = pq.read_table(path, columns=[c for c in names if columns is None or c in columns],
+                              filters=filters or None, memory_map=True)
+    else:
+        table = ipc.open_file(pa.memory_map(path)).read_all()
+        if low is not None:
+            table = table.filter(pc.field("Price") >= low)
+        if high is not None:
+            table = table.filter(pc.field("Price") <= high)
+        if columns is not None:
+            table = table.select([c for c in table.column_names if c in columns])
+    return table.to_pandas()
+
+
+def load_catalog(category, query, sites, columns=None, price_range=None, processed_dir=PROCESSED_DIR,
+                 reader=None):
+    """
+    {site: frame} for the processed tables of category/query, reading only
+    `sites` with reader (read_table by default; utils.catalog_cache.read_cached
+    serves repeated loads from memory).
+    """
+    reader = reader or read_table
+    frames = {}
+    for site in sites:
+        path = find_table(os.path.join(processed_dir, f"{site}_{category}_{query}"))
+        if path is not None:
+            frames[site] = reader(path, columns, price_range)
+    return frames
+
+
+def export_csv(path, export_dir=EXPORT_DIR):
+    """Write a CSV copy of the table at path to export_dir; return its path."""
+    name = os.path.basename(path)[:-len(EXTENSIONS[table_format(path)])] + ".csv"
+    os.makedirs(export_dir, exist_ok=True)
+    csv_path = os.path.join(export_dir, name)
+    read_table(path).to_csv(csv_path, index=False, encoding="utf-8-sig")
+    return csv_path
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Export stored tables as CSV")
+    parser.add_argument("paths", nargs="+", help="Table files to export")
+    parser.add_argument("--export-dir", default=EXPORT_DIR)
+    args = parser.parse_args()
+
+    for path in args.paths:
+        print(f"[INFO] Exported {path} → {export_csv(path, args.export_dir)}")
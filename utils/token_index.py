@@ -0,0 +1,140 @@
+# utils/token_index.py
+"""
+Inverted index from normalized title tokens to row ids.
+
+Built once when a catalog is loaded, so query filtering no longer
+tokenizes every title on every call:
+
+    index = TokenIndex(df["Product"])
+    df.iloc[index.lookup("macbook air m2")]     rows containing all three tokens
+    index.lookup("mac* 16gb")                   "mac*" matches any token starting with "mac"
+    index.lookup("macbook ai", prefix=True)     every query token is a prefix
+    index.lookup_many(queries)                  one lookup per query, each distinct
+                                                token resolved once for the batch
+
+Tokens are lowercase runs of letters and digits ("15.6" stays one token).
+Each token's rows are a sorted int32 array, so a query is the intersection
+of its tokens' arrays, smallest first. A query token also matches its
+SYNONYMS, and prefixes are a binary search over the sorted vocabulary.
+"""
+import re
+import numpy as np
+import pandas as pd
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+(?:\.[0-9]+)?")
+
+# Tokens that should find each other
+SYNONYMS = [
+    ("grey", "gray"),
+    ("colour", "color"),
+    ("laptop", "notebook"),
+    ("phone", "mobile", "smartphone"),
+    ("tv", "television"),
+    ("earphones", "earbuds", "headphones"),
+    ("fridge", "refrigerator"),
+    ("tshirt", "tee"),
+]
+SYNONYM_GROUPS = {token: group for group in SYNONYMS for token in group}
+
+
+def tokenize(text):
+    """Normalized tokens of text, in order."""
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+class TokenIndex:
+    """Token → sorted row ids (positions, for df.iloc) over a column of titles."""
+
+    def __init__(self, titles):
+        codes, uniques = pd.factorize(pd.Series(titles, dtype=object))
+        self.size = len(codes)
+
+        # Tokenize each distinct title once
+        token_lists = [sorted(set(tokenize(title))) for title in uniques]
+        lengths = np.fromiter(map(len, token_lists), dtype=np.int64, count=len(token_lists))
+        flat = np.array([token for tokens in token_lists for token in tokens], dtype=object)
+        token_codes, vocabulary = pd.factorize(flat, sort=True)
+        self.vocabulary = np.asarray(vocabulary, dtype=str)
+        self.ids = {token: i for i, token in enumerate(self.vocabulary)}
+
+        # (token, row) pairs: each row repeats the token run of its title
+        rows = np.flatnonzero(codes >= 0)
+        counts = lengths[codes[rows]]
+        title_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        token_ids = token_codes[np.repeat(title_starts[codes[rows]], counts) + within]
+        row_ids = np.repeat(rows, counts)
+
+        order = np.lexsort((row_ids, token_ids))
+        self.postings = row_ids[order].astype(np.int32)
+        self.offsets = np.searchsorted(token_ids[order], np.arange(len(self.vocabulary) + 1))
+
+    @property
+    def nbytes(self):
+        # The token → id dict costs roughly as much again as the vocabulary
+        return self.postings.nbytes + self.offsets.nbytes + 2 * self.vocabulary.nbytes
+
+    def _rows(self, token_ids):
+        parts = [self.postings[self.offsets[i]:self.offsets[i + 1]] for i in token_ids]
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return np.empty(0, dtype=np.int32)
+        # Union through a bitmap: no sort, linear in rows + postings
+        bitmap = np.zeros(self.size, dtype=bool)
+        for rows in parts:
+            bitmap[rows] = True
+        return np.flatnonzero(bitmap).astype(np.int32)
+
+    def term_ids(self, token, prefix=False):
+        """Vocabulary ids token stands for: itself and its synonyms, or every token they prefix."""
+        ids = []
+        for variant in SYNONYM_GROUPS.get(token, (token,)):
+            if prefix:
+                lo = np.searchsorted(self.vocabulary, variant, side="left")
+                hi = np.searchsorted(self.vocabulary, variant + "\U0010ffff", side="left")
+                ids.extend(range(lo, hi))
+            elif variant in self.ids:
+                ids.append(self.ids[variant])
+        return ids
+
+    def terms(self, query, prefix=False):
+        """(token, is_prefix) for each token of query."""
+        terms = []
+        for word in str(query).lower().split():
+            tokens = tokenize(word)
+            for i, token in enumerate(tokens):
+                terms.append((token, prefix or (word.endswith("*") and i == len(tokens) - 1)))
+        return terms
+
+    def lookup(self, query, prefix=False, _resolved=None):
+        """Sorted row ids whose title has every token of query (all rows for an empty query)."""
+        terms = self.terms(query, prefix)
+        if not terms:
+            return np.arange(self.size)
+
+        resolved = {} if _resolved is None else _resolved
+        for term in terms:
+            if term not in resolved:
+                resolved[term] = self._rows(self.term_ids(*term))
+        postings = sorted((resolved[term] for term in set(terms)), key=len)
+        result = postings[0]
+        for rows in postings[1:]:
+            if not len(result):
+                break
+            # Binary-search the (shorter) result in the next array
+            pos = np.minimum(np.searchsorted(rows, result), len(rows) - 1)
+            result = result[rows[pos] == result]
+        return result
+
+    def lookup_many(self, queries, prefix=False):
+        """lookup for each of queries, resolving each distinct term once for the whole batch."""
+        resolved = {}
+        for query in queries:
+            yield self.lookup(query, prefix, resolved)
+
+    def mask(self, query, prefix=False):
+        """Boolean mask over the rows, True where the title matches query."""
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.lookup(query, prefix)] = True
+        return mask